@@ -8,7 +8,7 @@ from agents.tools.flows.quality import mark_quality_done
 class DidacticAgent(LlmAgent):
     """
     Roda em paralelo com SecurityAgent.
-    O KeyError é evitado inicializando 'revisao_seguranca' no state antes do loop.
+    O KeyError é evitado inicializando 'temp:revisao_seguranca' no state antes do loop.
     Após o paralelo, lê o valor já populado pelo SecurityAgent da mesma rodada.
     """
 
@@ -24,8 +24,8 @@ class DidacticAgent(LlmAgent):
             instruction=(
                 "Você avalia e, se necessário, melhora a resposta atual.\n\n"
                 "Entradas disponíveis:\n"
-                "- Resposta atual: {resposta_consultor}\n"
-                "- Resultado de segurança: {revisao_seguranca}\n\n"
+                "- Resposta atual: {temp:resposta_consultor}\n"
+                "- Resultado de segurança: {temp:revisao_seguranca}\n\n"
                 "Siga EXATAMENTE estas regras em ordem:\n\n"
                 "1) Se 'revisao_seguranca' contiver STATUS: BLOQUEADO:\n"
                 "   - Substitua o rascunho por: 'Desculpe, não posso responder a essa solicitação.'\n"
@@ -41,5 +41,5 @@ class DidacticAgent(LlmAgent):
                 "     * NÃO chame 'mark_quality_done'.\n"
                 "     * Retorne apenas o texto reescrito (sem notas, sem explicações extras).\n"
             ),
-            output_key="resposta_rascunho",
+            output_key="temp:resposta_rascunho",
         )
\ No newline at end of file
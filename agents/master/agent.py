@@ -1,41 +1,84 @@
 # app_agents.py
 from __future__ import annotations
 
+import asyncio
+import logging
+import time
+from contextlib import aclosing
+
 from google.adk.tools.function_tool import FunctionTool
-from typing import AsyncGenerator, List
+from typing import AsyncGenerator, List, Optional
 
 from google.adk.agents import Agent, ParallelAgent, BaseAgent
 from google.adk.agents.invocation_context import InvocationContext
-from google.adk.events import Event
+from google.adk.agents.run_config import StreamingMode
+from google.adk.events import Event, EventActions
+from google.adk.flows.llm_flows import functions
 from google.adk.apps.app import App
 from google.adk.agents.context_cache_config import ContextCacheConfig
 from google.adk.tools.base_tool import BaseTool
+from google.genai import types
 
 # Modifique estas linhas:
 from agents.recepcionist.agent import ReceptionistAgent
+from agents.recepcionist.router import PreRouter
 from agents.didactic.agent import DidacticAgent
-from agents.security.agent import SecurityAgent
+from agents.security.agent import QuestionSecurityAgent, SecurityAgent
+from agents.security.draft_check import check_draft, is_blocked
 from agents.tom.agent import FinalAgent
 
 from agents.specialists.fordka.agent import fordKa
 from agents.specialists.mobi.agent import fiatMobi
 from agents.specialists.generalist.agent import generalista
 from agents.tools.flows.done import mark_flow_done
+from agents.tools.config import (
+    ROUTER_EMBEDDINGS,
+    ROUTER_ENABLED,
+    ROUTER_HISTORY_QUESTIONS,
+    ROUTER_MIN_CONFIDENCE,
+    SPECIALIST_MANUALS,
+    SPECULATIVE_SECURITY,
+    configure_embedding,
+)
+from agents.tools.toolset import manual_version
+from agents.plugins.answer_cache import get_answer_cache
+from agents.plugins.progress import progress_channel, report
+from agents.plugins.sessions import SessionFlushPlugin, flush_turn
+from agents.plugins.telemetry import TelemetryPlugin, ENABLED as TELEMETRY_ENABLED, cache_result, count, observe
+from agents.master.policy import BLOCKED_TEXT, QualityPolicy, SECURITY_CACHE_SIZE, draft_hash
+
+logger = logging.getLogger(__name__)
 
 
 class CarHelperMasterAgent(BaseAgent):
     receptionist: Agent
+    security: Agent
     parallel_review: ParallelAgent
+    didactic: Agent
     finalizer: Agent
+    policy: QualityPolicy
+    router: Optional[PreRouter] = None
+    # Triagem da pergunta em paralelo com roteamento/busca (None = desligada)
+    question_security: Optional[Agent] = None
 
     def __init__(
             self,
-            tools: List[BaseTool]
+            tools: List[BaseTool],
+            policy: QualityPolicy | None = None,
+            router: PreRouter | None = None,
+            speculative_security: bool = SPECULATIVE_SECURITY,
     ):
+        if router is None and ROUTER_ENABLED:
+            router = PreRouter(
+                min_confidence=ROUTER_MIN_CONFIDENCE,
+                embed=configure_embedding() if ROUTER_EMBEDDINGS else None,
+            )
+
         receptionist    = ReceptionistAgent(tools=tools)
         security        = SecurityAgent()
         didactic        = DidacticAgent()
         finalizer       = FinalAgent()
+        question_security = QuestionSecurityAgent() if speculative_security else None
         parallel_review = ParallelAgent(
             name="agentes_paralelos_validacao",
             sub_agents=[security, didactic]
@@ -44,46 +87,472 @@ class CarHelperMasterAgent(BaseAgent):
         super().__init__(
             name="fluxo_carros_lightrag_openai_master",
             receptionist=receptionist,
+            security=security,
             parallel_review=parallel_review,
+            didactic=didactic,
             finalizer=finalizer,
+            policy=policy or QualityPolicy.from_env(),
+            router=router,
+            question_security=question_security,
             sub_agents=[
                 receptionist,
                 parallel_review,
                 finalizer,
+                *([question_security] if question_security else []),
             ],
         )
 
     async def _run_async_impl(
         self, ctx: InvocationContext
     ) -> AsyncGenerator[Event, None]:
-        ctx.session.state["flow_done"] = False
-        ctx.session.state["quality_done"] = False
+        # Se o cliente desconectar no meio do turno (SSE), o Runner fecha este
+        # gerador sem chegar ao after_run: o lote de eventos é gravado aqui
+        events = self._run_events(ctx)
+        try:
+            async for event in events:
+                yield event
+        finally:
+            await events.aclose()
+            await flush_turn(ctx)
+
+    async def _run_events(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        run_config = ctx.run_config
+        if run_config is None or run_config.streaming_mode != StreamingMode.SSE:
+            async for event in self._run_turn(ctx):
+                yield event
+            return
 
-        # Inicializa variáveis para evitar KeyError nos agentes de revisão
-        ctx.session.state.setdefault("resposta_consultor", "")
-        ctx.session.state.setdefault("revisao_seguranca", "STATUS: SEGURO\nMOTIVO: Nenhuma resposta técnica gerada.")
-        ctx.session.state.setdefault("resposta_rascunho", "")
+        # Streaming (SSE): o turno roda em uma task própria e, enquanto isso,
+        # mensagens de progresso (report) viram eventos parciais. Dos eventos
+        # parciais dos agentes, só os tokens do finalizador chegam ao cliente.
+        queue: asyncio.Queue = asyncio.Queue()
 
-        # 1) Recepcionista
-        async for event in self.receptionist.run_async(ctx):
-            yield event
+        async def pump() -> None:
+            try:
+                async for event in self._run_turn(ctx):
+                    # Espera o Runner processar o evento (state_delta) antes de seguir
+                    ack = asyncio.get_running_loop().create_future()
+                    queue.put_nowait((event, ack))
+                    await ack
+            finally:
+                queue.put_nowait(None)
 
-        # Early return FORA do async for — funciona corretamente
-        if ctx.session.state.get("flow_done") is True:
+        with progress_channel(queue):
+            task = asyncio.create_task(pump())
+        try:
+            while (item := await queue.get()) is not None:
+                if isinstance(item, str):
+                    yield Event(
+                        invocation_id=ctx.invocation_id,
+                        author=self.name,
+                        branch=ctx.branch,
+                        partial=True,
+                        content=types.Content(role="model", parts=[types.Part(text=item)]),
+                        custom_metadata={"progresso": True},
+                    )
+                    continue
+                event, ack = item
+                if not event.partial or event.author == self.finalizer.name:
+                    yield event
+                ack.set_result(None)
+            await task
+        finally:
+            task.cancel()
+
+    async def _run_turn(
+        self, ctx: InvocationContext
+    ) -> AsyncGenerator[Event, None]:
+        started = time.monotonic()
+
+        # Estado do turno refeito a cada pergunta: nada de rascunho ou veredito
+        # de um turno anterior vale para este (e evita KeyError nos agentes de revisão)
+        yield self._state_event(ctx, {
+            "temp:flow_done": False,
+            "temp:quality_done": False,
+            "cache_hit": False,
+            "temp:resposta_consultor": "",
+            "temp:revisao_seguranca": "STATUS: SEGURO\nMOTIVO: Nenhuma resposta técnica gerada.",
+            "temp:resposta_rascunho": "",
+        })
+
+        question = _user_text(ctx)
+        answer_cache = get_answer_cache()
+        # Embedding da pergunta para o cache calculado enquanto o roteamento decide
+        prefetch = answer_cache.prefetch(question)
+        try:
+            async for event in self._route_and_answer(ctx, question, answer_cache, prefetch, started):
+                yield event
+        finally:
+            if prefetch is not None:
+                prefetch.cancel()
+
+    async def _route_and_answer(
+        self, ctx: InvocationContext, question: str, answer_cache, prefetch, started: float
+    ) -> AsyncGenerator[Event, None]:
+        tokens = 0
+
+        # 1) Pré-roteador local; sem confiança suficiente, o recepcionista (LLM) decide
+        route = await self.router.route(question) if self.router else None
+        specialist = None
+        if route is not None and route.reply is not None:
+            count("carhelper_route_total", route=route.kind)
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                content=types.Content(role="model", parts=[types.Part(text=route.reply)]),
+                actions=EventActions(state_delta={
+                    "resposta_recepcionista": route.reply,
+                    "rota": route.kind,
+                    "temp:flow_done": True,
+                }),
+            )
             return
 
-        for _ in range(5):
-            # 3) Loop: paralelo segurança + didática
-            async for event in self.parallel_review.run_async(ctx):
+        # A rota vale só para este turno (não fica a de um turno anterior)
+        yield self._state_event(ctx, {
+            "rota": "specialist" if route is not None and route.kind == "specialist" else "recepcionista",
+        })
+
+        # Cache semântico: assim que o especialista é conhecido (pelo pré-roteador
+        # ou pela chamada de tool do recepcionista) e antes de ele rodar, um hit
+        # do mesmo especialista encerra o turno com a resposta guardada
+        hit = None
+
+        async def lookup(name: str) -> bool:
+            nonlocal hit
+            hit = await answer_cache.lookup(question, version_of=manual_version, specialist=name, vector=prefetch)
+            cache_result("answers", "hit" if hit is not None else "miss")
+            return hit is not None
+
+        async def dispatch() -> AsyncGenerator[Event, None]:
+            nonlocal specialist, tokens
+            if route is not None and route.kind == "specialist":
+                specialist = route.specialist
+                if await lookup(specialist):
+                    return
+                report("Consultando o especialista…")
+                async for event in self._run_specialist(ctx, specialist, question):
+                    yield event
+                return
+
+            answer = None
+            async with aclosing(self.receptionist.run_async(ctx)) as events:
+                async for event in events:
+                    tokens += _tokens(event)
+                    calls = [call.name for call in event.get_function_calls() if call.name in SPECIALIST_MANUALS]
+                    # A chamada ao especialista não chega à sessão quando o cache responde
+                    if calls and await lookup(calls[-1]):
+                        specialist = calls[-1]
+                        return
+                    if calls:
+                        specialist = calls[-1]
+                    for response in event.get_function_responses():
+                        if response.name in SPECIALIST_MANUALS:
+                            answer = _response_text(response.response)
+                    yield event
+            if answer is not None:
+                # A resposta do especialista é o rascunho do loop de qualidade
+                yield self._state_event(ctx, {"temp:resposta_consultor": answer})
+
+        # 2) Especialista; com a triagem especulativa, a pergunta é avaliada
+        #    ao mesmo tempo e um bloqueio cancela a busca em andamento
+        verdict = ""
+        if self.question_security is None:
+            async for event in dispatch():
                 yield event
+        else:
+            screening = asyncio.create_task(self._screen_question(ctx))
+            try:
+                async for event in self._until_blocked(dispatch(), screening):
+                    yield event
+                if hit is None and ctx.session.state.get("temp:flow_done") is not True:
+                    events, verdict = await screening
+                    for event in events:
+                        tokens += _tokens(event)
+                        yield event
+            finally:
+                screening.cancel()
+
+            if is_blocked(verdict):
+                count("carhelper_route_total", route=route.kind if route is not None else "recepcionista")
+                count("carhelper_quality_exit_total", reason="blocked_question")
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    content=types.Content(role="model", parts=[types.Part(text=BLOCKED_TEXT)]),
+                    actions=EventActions(state_delta={
+                        "resposta_final": BLOCKED_TEXT,
+                        "temp:revisao_seguranca": verdict,
+                        "quality_reason": "blocked_question",
+                        "temp:flow_done": True,
+                    }),
+                )
+                return
 
-            if ctx.session.state.get("quality_done") is True:
+        if hit is not None:
+            count("carhelper_route_total", route="cache")
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                branch=ctx.branch,
+                content=types.Content(role="model", parts=[types.Part(text=hit.answer)]),
+                actions=EventActions(state_delta={
+                    "resposta_final": hit.answer,
+                    "cache_hit": True,
+                    "temp:flow_done": True,
+                }),
+            )
+            return
+        count("carhelper_route_total", route=route.kind if route is not None else "recepcionista")
+
+        # Early return FORA do async for — funciona corretamente
+        if ctx.session.state.get("temp:flow_done") is True:
+            return
+
+        # 3) Loop de qualidade: segurança + didática, com orçamento por turno
+        state = ctx.session.state
+        security_cache = dict(state.get("security_cache", {}))
+        rounds, reason = 0, self.policy.skip_reason(state)
+        if reason is None:
+            report("Revisando a resposta…")
+
+        while reason is None:
+            # O orçamento só encerra o loop depois de um veredito de segurança
+            if rounds > 0:
+                reason = self.policy.budget_reason(time.monotonic() - started, tokens)
+                if reason is not None:
+                    break
+            if rounds >= self.policy.max_rounds:
+                reason = "max_rounds"
                 break
 
+            rounds += 1
+            draft = state.get("temp:resposta_consultor", "")
+            key = draft_hash(draft)
+
+            # Pergunta já triada: no rascunho basta a verificação local
+            if verdict:
+                yield self._state_event(ctx, {"temp:revisao_seguranca": check_draft(draft)})
+                review = self.didactic
+            # Rascunho já avaliado pela segurança: só a didática roda
+            elif key in security_cache:
+                yield self._state_event(ctx, {"temp:revisao_seguranca": security_cache[key]})
+                review = self.didactic
+            else:
+                review = self.parallel_review
+
+            async for event in review.run_async(ctx):
+                tokens += _tokens(event)
+                yield event
+
+            if review is self.parallel_review:
+                security_cache[key] = state.get("temp:revisao_seguranca", "")
+            if state.get("temp:quality_done") is True:
+                reason = "approved"
+            elif is_blocked(state.get("temp:revisao_seguranca", "")):
+                reason = "blocked"
+            else:
+                # A próxima rodada avalia a versão reescrita pela didática
+                yield self._state_event(ctx, {
+                    "temp:resposta_consultor": state.get("temp:resposta_rascunho") or draft,
+                })
+
+        reviewed = rounds > 0
+        if rounds == 0:
+            # Nada foi revisado: o finalizador usa o rascunho do especialista
+            draft = state.get("temp:resposta_consultor", "")
+            yield self._state_event(ctx, {"temp:resposta_rascunho": draft})
+            if reason == "max_rounds":
+                # Sem rodadas de revisão (max_rounds=0), a segurança ainda dá o veredito
+                key = draft_hash(draft)
+                if verdict:
+                    yield self._state_event(ctx, {"temp:revisao_seguranca": check_draft(draft)})
+                elif key in security_cache:
+                    yield self._state_event(ctx, {"temp:revisao_seguranca": security_cache[key]})
+                else:
+                    async for event in self.security.run_async(ctx):
+                        tokens += _tokens(event)
+                        yield event
+                    security_cache[key] = state.get("temp:revisao_seguranca", "")
+                reviewed = True
+                if is_blocked(state.get("temp:revisao_seguranca", "")):
+                    reason = "blocked"
+
+        observe("carhelper_quality_rounds", rounds)
+        count("carhelper_quality_exit_total", reason=reason)
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta={
+                "temp:resposta_rascunho": state.get("temp:resposta_rascunho", ""),
+                "quality_rounds": rounds,
+                "quality_reason": reason,
+                "security_cache": dict(list(security_cache.items())[-SECURITY_CACHE_SIZE:]),
+            }),
+        )
+
         # 4) Finalizador
         async for event in self.finalizer.run_async(ctx):
             yield event
 
+        # Só respostas de especialistas revisadas pela segurança e não bloqueadas entram no cache
+        final = ctx.session.state.get("resposta_final", "")
+        blocked = is_blocked(ctx.session.state.get("temp:revisao_seguranca", ""))
+        if specialist and final and reviewed and not blocked:
+            await answer_cache.store(question, specialist, final, manual_version(specialist))
+
+
+    def _state_event(self, ctx: InvocationContext, delta: dict) -> Event:
+        """Evento só com state_delta; o Runner aplica o delta à sessão ao recebê-lo."""
+        return Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            branch=ctx.branch,
+            actions=EventActions(state_delta=delta),
+        )
+
+    async def _screen_question(self, ctx: InvocationContext) -> tuple[List[Event], str]:
+        """Roda a triagem da pergunta; devolve os eventos e o veredito ('' se falhar)."""
+        agent = self.question_security
+        branch = f"{ctx.branch}.{agent.name}" if ctx.branch else f"{self.name}.{agent.name}"
+        events = []
+        try:
+            async for event in agent.run_async(ctx.model_copy(update={"branch": branch})):
+                events.append(event)
+        except Exception:
+            # Sem veredito, o rascunho passa pela revisão de segurança completa
+            logger.exception("Falha na triagem de segurança")
+            return events, ""
+        verdict = next(
+            (e.actions.state_delta[agent.output_key] for e in reversed(events)
+             if agent.output_key in e.actions.state_delta),
+            "",
+        )
+        return events, verdict
+
+    async def _until_blocked(
+        self, events: AsyncGenerator[Event, None], screening: asyncio.Task
+    ) -> AsyncGenerator[Event, None]:
+        """
+        Repassa os eventos de `events` até o fim ou até a triagem bloquear a
+        pergunta; nesse caso o trabalho em andamento (especialista, LightRAG)
+        é cancelado.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def pump() -> None:
+            try:
+                async for event in events:
+                    ack = asyncio.get_running_loop().create_future()
+                    queue.put_nowait((event, ack))
+                    await ack
+            finally:
+                queue.put_nowait(None)
+
+        task = asyncio.create_task(pump())
+        get = None
+        try:
+            while True:
+                get = get or asyncio.ensure_future(queue.get())
+                waiting = {get} if screening.done() else {get, screening}
+                await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                if screening.done() and not screening.cancelled() and is_blocked(screening.result()[1]):
+                    return
+                if not get.done():
+                    continue
+                item, get = get.result(), None
+                if item is None:
+                    break
+                event, ack = item
+                yield event
+                ack.set_result(None)
+            await task
+        finally:
+            if get is not None:
+                get.cancel()
+            task.cancel()
+
+    async def _run_specialist(
+        self, ctx: InvocationContext, name: str, question: str
+    ) -> AsyncGenerator[Event, None]:
+        """
+        Chama a tool do especialista como o recepcionista faria: a chamada
+        passa pelo fluxo de tools do ADK (callbacks dos plugins e do agente,
+        on_tool_error, tracing) e fica na sessão com a resposta. O especialista
+        roda numa sessão própria, então as perguntas anteriores do usuário vão
+        junto na requisição.
+        """
+        tool = next(t for t in self.receptionist.tools if t.name == name)
+        previous = _previous_questions(ctx)
+        if previous:
+            request = (
+                "Perguntas anteriores do usuário (contexto):\n"
+                + "\n".join(f"- {q}" for q in previous)
+                + f"\n\nPergunta atual: {question}"
+            )
+        else:
+            request = question
+
+        call = Event(
+            invocation_id=ctx.invocation_id,
+            author=self.receptionist.name,
+            branch=ctx.branch,
+            content=types.Content(role="model", parts=[types.Part(function_call=types.FunctionCall(
+                id=functions.generate_client_function_call_id(), name=name, args={"request": request},
+            ))]),
+        )
+        yield call
+        response = await functions.handle_function_calls_async(
+            ctx.model_copy(update={"agent": self.receptionist}), call, {name: tool}
+        )
+        if response is None:
+            return
+        yield response
+
+        answer = next(
+            (_response_text(r.response) for r in response.get_function_responses() if r.name == name), ""
+        )
+        yield self._state_event(ctx, {"temp:resposta_consultor": answer})
+
+
+def _tokens(event: Event) -> int:
+    # Em streaming, o uso vem no evento completo; parciais não são somados
+    usage = None if event.partial else event.usage_metadata
+    return (usage.total_token_count or 0) if usage else 0
+
+
+def _response_text(response) -> str:
+    # O ADK embrulha retornos que não são dict em {"result": ...}
+    if isinstance(response, dict):
+        response = response.get("result", "")
+    return response if isinstance(response, str) else str(response or "")
+
+
+def _user_text(ctx: InvocationContext) -> str:
+    if not ctx.user_content or not ctx.user_content.parts:
+        return ""
+    return "".join(part.text or "" for part in ctx.user_content.parts)
+
+
+def _previous_questions(ctx: InvocationContext, limit: int = ROUTER_HISTORY_QUESTIONS) -> List[str]:
+    """Últimas mensagens do usuário antes da atual, da mais antiga para a mais recente."""
+    questions = []
+    for event in reversed(ctx.session.events):
+        if len(questions) >= limit:
+            break
+        if event.author != "user" or event.invocation_id == ctx.invocation_id or not event.content:
+            continue
+        text = "".join(part.text or "" for part in event.content.parts or []).strip()
+        if text:
+            questions.append(text)
+    return questions[::-1]
+
+
 tools = [
     FunctionTool(func=mark_flow_done),
     fordKa,
@@ -95,6 +564,7 @@ root_agent = CarHelperMasterAgent(tools=tools)
 app = App(
     name="master",
     root_agent=root_agent,
+    plugins=[SessionFlushPlugin()] + ([TelemetryPlugin()] if TELEMETRY_ENABLED else []),
     context_cache_config=ContextCacheConfig(
         min_tokens=2048,
         ttl_seconds=600,
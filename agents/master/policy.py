@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import hashlib
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+# Texto canônico de bloqueio (o mesmo que o DidacticAgent usa)
+BLOCKED_TEXT = "Desculpe, não posso responder a essa solicitação."
+
+# Quantos vereditos de segurança por rascunho ficam guardados na sessão
+SECURITY_CACHE_SIZE = 32
+
+
+def draft_hash(text: str) -> str:
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class QualityPolicy:
+    """
+    Limites do loop de revisão (segurança + didática) por turno.
+
+    - max_rounds: rodadas de revisão no máximo
+    - max_seconds: tempo total do turno a partir do qual a resposta é finalizada
+    - max_tokens: tokens de LLM no turno a partir dos quais a resposta é finalizada
+    """
+
+    max_rounds: int = 5
+    max_seconds: float = 30.0
+    max_tokens: int = 20000
+
+    @classmethod
+    def from_env(cls) -> "QualityPolicy":
+        return cls(
+            max_rounds=int(os.getenv("CARHELPER_QUALITY_MAX_ROUNDS", "5")),
+            max_seconds=float(os.getenv("CARHELPER_QUALITY_MAX_SECONDS", "30")),
+            max_tokens=int(os.getenv("CARHELPER_QUALITY_MAX_TOKENS", "20000")),
+        )
+
+    def skip_reason(self, state: dict) -> Optional[str]:
+        """Motivo para não revisar o rascunho, ou None se a revisão deve rodar."""
+        draft = state.get("temp:resposta_consultor", "")
+        if draft.strip() == BLOCKED_TEXT:
+            return "blocked_text"
+        if not draft.strip():
+            return "empty_draft"
+        return None
+
+    def budget_reason(self, elapsed: float, tokens: int) -> Optional[str]:
+        """Motivo para encerrar o loop por orçamento, ou None se ainda há orçamento."""
+        if elapsed >= self.max_seconds:
+            return "budget_time"
+        if tokens >= self.max_tokens:
+            return "budget_tokens"
+        return None
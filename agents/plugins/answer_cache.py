@@ -0,0 +1,311 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+EmbedFunc = Callable[[List[str]], Awaitable[np.ndarray]]
+VersionFunc = Callable[[str], str]
+
+
+def normalize_query(text: str) -> str:
+    """Minúsculas, sem acentos, pontuação ou espaços repetidos."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+# Perguntas que dependem do histórico ("e o torque?", "e do Mobi?") ou que não
+# são perguntas técnicas não entram no cache: a mesma frase pode pedir outra resposta.
+# "é possível..." também vira "e possivel" na normalização, por isso a lista fechada
+MIN_QUERY_WORDS = 4
+FOLLOW_UP = re.compile(r"^(e (o|a|os|as|do|da|dos|das|no|na|nos|nas|quanto|sobre|se|pra|pro|para)|mas|entao|tambem)\b")
+GREETING = re.compile(r"^(oi|ola|bom dia|boa tarde|boa noite|obrigad\w*|valeu|tchau)\b")
+
+
+def cacheable_query(text: str) -> bool:
+    """Se a pergunta se sustenta sozinha (sem depender da conversa) para o cache."""
+    normalized = normalize_query(text)
+    return (
+        len(normalized.split()) >= MIN_QUERY_WORDS
+        and not FOLLOW_UP.match(normalized)
+        and not GREETING.match(normalized)
+    )
+
+
+@dataclass
+class CacheHit:
+    specialist: str
+    answer: str
+    similarity: float
+
+
+class SemanticAnswerCache:
+    """
+    Cache de respostas finais por (especialista, embedding da pergunta normalizada).
+
+    - Uma consulta é um hit quando a similaridade de cosseno com uma pergunta
+      armazenada é >= `threshold` e a versão dos manuais do especialista é a
+      mesma de quando a resposta foi gerada.
+    - Entradas expiram após `ttl_seconds`; acima de `max_entries`, as menos
+      usadas recentemente são removidas.
+    - Persistido em SQLite; os vetores ficam também em memória para a busca.
+      Só entradas do modelo de embedding atual (`model`) são consideradas.
+      O SQLite é acessado fora do event loop (asyncio.to_thread).
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        embed: EmbedFunc,
+        model: str = "",
+        threshold: float = 0.93,
+        ttl_seconds: int = 7 * 24 * 3600,
+        max_entries: int = 5000,
+    ):
+        self.db_path = db_path
+        self.embed = embed
+        self.model = model
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY,"
+            " specialist TEXT NOT NULL,"
+            " query_hash TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " embedding BLOB NOT NULL,"
+            " answer TEXT NOT NULL,"
+            " version TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " UNIQUE (specialist, query_hash))"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(answers)")}
+        if "model" not in columns:
+            self._conn.execute("ALTER TABLE answers ADD COLUMN model TEXT NOT NULL DEFAULT ''")
+        self._conn.commit()
+        # Serializa o uso da conexão entre as threads do to_thread
+        self._db_lock = threading.Lock()
+        self._lock = asyncio.Lock()
+        self._set_index(*self._load())
+
+    def _set_index(self, ids: List[int], meta: List[tuple], matrix: np.ndarray) -> None:
+        # Trocados juntos (nunca alterados no lugar): uma busca em andamento
+        # continua com a versão anterior do índice
+        self._ids, self._meta, self._matrix = ids, meta, matrix
+
+    def _load(self) -> tuple:
+        with self._db_lock:
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+            rows = self._conn.execute(
+                "SELECT id, specialist, query_hash, embedding, version, created_at FROM answers WHERE model = ?",
+                (self.model,),
+            ).fetchall()
+        ids = [r[0] for r in rows]
+        meta = [(r[1], r[2], r[4], r[5]) for r in rows]
+        matrix = (
+            np.vstack([np.frombuffer(r[3], dtype=np.float32) for r in rows])
+            if rows else np.zeros((0, 0), dtype=np.float32)
+        )
+        return ids, meta, matrix
+
+    async def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray((await self.embed([text]))[0], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _fetch_answer(self, row_id: int, now: float) -> Optional[tuple]:
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT specialist, answer FROM answers WHERE id = ?", (row_id,)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, row_id))
+                self._conn.commit()
+        return row
+
+    def prefetch(self, query: str) -> Optional["asyncio.Task[np.ndarray]"]:
+        """
+        Começa a calcular o embedding da pergunta em segundo plano (em paralelo
+        com o roteamento), para o `lookup` não esperar por ele. None quando a
+        pergunta não entra no cache ou o cache está vazio.
+        """
+        if not self._ids or not cacheable_query(query):
+            return None
+        return asyncio.ensure_future(self._embed(normalize_query(query)))
+
+    async def lookup(
+        self,
+        query: str,
+        version_of: VersionFunc,
+        specialist: str,
+        vector: Optional[Awaitable[np.ndarray]] = None,
+    ) -> Optional[CacheHit]:
+        """
+        Procura uma resposta válida do mesmo especialista para a pergunta.
+        Perguntas que dependem da conversa (ver `cacheable_query`) nunca são hit.
+        `vector` é o embedding já em cálculo (ver `prefetch`). Sem entradas
+        válidas do especialista, ou com a pergunta idêntica em cache, o
+        embedding nem é esperado.
+        """
+        ids, meta, matrix = self._ids, self._meta, self._matrix
+        if not ids or not cacheable_query(query):
+            self.misses += 1
+            return None
+
+        normalized = normalize_query(query)
+        query_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        now = time.time()
+        versions: Dict[str, str] = {}
+
+        def valid(i: int) -> bool:
+            spec, _, version, created_at = meta[i]
+            if spec != specialist or now - created_at >= self.ttl_seconds:
+                return False
+            if spec not in versions:
+                versions[spec] = version_of(spec)
+            return version == versions[spec]
+
+        candidates = [i for i in range(len(meta)) if valid(i)]
+        best, best_sim = None, 0.0
+        # Pergunta idêntica após normalização dispensa o embedding
+        for i in candidates:
+            if meta[i][1] == query_hash:
+                best, best_sim = i, 1.0
+                break
+
+        if best is None and candidates:
+            query_vector = await (vector if vector is not None else self._embed(normalized))
+            similarities = matrix[candidates] @ query_vector
+            top = int(np.argmax(similarities))
+            if similarities[top] >= self.threshold:
+                best, best_sim = candidates[top], float(similarities[top])
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        row = await asyncio.to_thread(self._fetch_answer, ids[best], now)
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return CacheHit(specialist=row[0], answer=row[1], similarity=best_sim)
+
+    def _insert(self, row: tuple) -> tuple:
+        """Grava a entrada e aplica a evicção LRU; devolve (id novo, ids removidos)."""
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT OR REPLACE INTO answers"
+                " (specialist, query_hash, query, embedding, answer, version, created_at, last_used, model)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            row_id = cursor.lastrowid
+            evicted = [
+                r[0] for r in self._conn.execute(
+                    "SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?",
+                    (self.max_entries,),
+                )
+            ]
+            self._conn.executemany("DELETE FROM answers WHERE id = ?", [(i,) for i in evicted])
+            self._conn.commit()
+        return row_id, evicted
+
+    async def store(self, query: str, specialist: str, answer: str, version: str) -> None:
+        if not cacheable_query(query) or not answer.strip():
+            return
+
+        normalized = normalize_query(query)
+        vector = await self._embed(normalized)
+        query_hash = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+        now = time.time()
+
+        async with self._lock:
+            row_id, evicted = await asyncio.to_thread(
+                self._insert,
+                (specialist, query_hash, query, vector.tobytes(), answer, version, now, now, self.model),
+            )
+            # Atualiza o índice em memória sem reler a tabela: sai a entrada
+            # substituída (mesmo especialista e pergunta) e as removidas pela evicção
+            removed = set(evicted)
+            keep = [
+                i for i, (spec, qhash, _, _) in enumerate(self._meta)
+                if self._ids[i] not in removed and (spec, qhash) != (specialist, query_hash)
+            ]
+            if keep:
+                matrix = np.vstack([self._matrix[keep], vector[None, :]])
+            else:
+                matrix = vector[None, :]
+            self._set_index(
+                [self._ids[i] for i in keep] + [row_id],
+                [self._meta[i] for i in keep] + [(specialist, query_hash, version, now)],
+                matrix,
+            )
+
+    async def invalidate(self, specialist: Optional[str] = None) -> None:
+        def delete() -> None:
+            with self._db_lock:
+                if specialist is None:
+                    self._conn.execute("DELETE FROM answers")
+                else:
+                    self._conn.execute("DELETE FROM answers WHERE specialist = ?", (specialist,))
+                self._conn.commit()
+
+        async with self._lock:
+            await asyncio.to_thread(delete)
+            self._set_index(*await asyncio.to_thread(self._load))
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._ids),
+        }
+
+
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """Cache do processo, criado no primeiro uso com a configuração de agents.tools.config."""
+    global _answer_cache
+    if _answer_cache is None:
+        from agents.tools.config import (
+            ANSWER_CACHE_DB,
+            ANSWER_CACHE_MAX_ENTRIES,
+            ANSWER_CACHE_THRESHOLD,
+            ANSWER_CACHE_TTL_SECONDS,
+            configure_embedding,
+        )
+
+        embedding = configure_embedding()
+        _answer_cache = SemanticAnswerCache(
+            ANSWER_CACHE_DB,
+            embed=embedding,
+            model=embedding.func.backend.name,
+            threshold=ANSWER_CACHE_THRESHOLD,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            max_entries=ANSWER_CACHE_MAX_ENTRIES,
+        )
+    return _answer_cache
@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Protocol
+
+import numpy as np
+
+
+class EmbeddingBackend(Protocol):
+    name: str
+    dim: int
+
+    async def embed(self, texts: List[str]) -> np.ndarray: ...
+
+
+class OpenAIEmbeddingBackend:
+    """Embeddings via API da OpenAI (o comportamento original do LightRAG)."""
+
+    def __init__(self, model_name: str = "text-embedding-3-small", dim: int = 1536):
+        self.name = f"openai/{model_name}"
+        self.model_name = model_name
+        self.dim = dim
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        from lightrag.llm.openai import openai_embed
+
+        # openai_embed é um EmbeddingFunc; .func é a corrotina sem o limitador do LightRAG
+        return await openai_embed.func(texts, model=self.model_name)
+
+
+class SentenceTransformerBackend:
+    """
+    Embeddings locais com sentence-transformers em CPU.
+    O encode roda em um executor dedicado para não bloquear o event loop,
+    em lotes de `batch_size` textos.
+    """
+
+    def __init__(self, model_name: str, device: str = "cpu", batch_size: int = 32, offline: bool = False):
+        if offline:
+            # Só usa arquivos já presentes no cache do Hugging Face (ou um caminho local)
+            os.environ.setdefault("HF_HUB_OFFLINE", "1")
+            os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+        from sentence_transformers import SentenceTransformer
+
+        self.name = f"st/{model_name}"
+        self.batch_size = batch_size
+        self._model = SentenceTransformer(model_name, device=device)
+        self.dim = self._model.get_sentence_embedding_dimension()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="st-embed")
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        return self._model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False,
+        ).astype(np.float32)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._encode, texts)
+
+
+class EmbeddingStore:
+    """Cache persistente de embeddings em SQLite, chave = sha256(modelo + texto)."""
+
+    def __init__(self, db_path: str):
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        # Limite de parâmetros do SQLite
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            found.update({k: np.frombuffer(v, dtype=np.float32) for k, v in rows})
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray]) -> None:
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+            [(k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()],
+        )
+        self._conn.commit()
+
+
+class CachedEmbedder:
+    """
+    Envolve um backend com o cache persistente: só os textos ainda não vistos
+    (para o mesmo modelo) são enviados ao backend, em uma única chamada.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, store: Optional[EmbeddingStore] = None):
+        self.backend = backend
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    async def __call__(self, texts: List[str], **kwargs) -> np.ndarray:
+        if self.store is None:
+            return await self.backend.embed(texts)
+
+        keys = [EmbeddingStore.key(self.backend.name, t) for t in texts]
+        cached = await asyncio.to_thread(self.store.get_many, list(set(keys)))
+
+        missing = list(dict.fromkeys(t for t, k in zip(texts, keys) if k not in cached))
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = await self.backend.embed(missing)
+            new = {EmbeddingStore.key(self.backend.name, t): v for t, v in zip(missing, vectors)}
+            await asyncio.to_thread(self.store.put_many, new)
+            cached.update(new)
+
+        return np.vstack([cached[k] for k in keys])
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses}
@@ -0,0 +1,83 @@
+import asyncio
+import os
+from typing import Dict, Tuple
+
+from lightrag import LightRAG
+
+from agents.plugins.ingestion import initialize_rag, DEFAULT_STORAGES
+
+
+EngineKey = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+
+class RagEngineRegistry:
+    """
+    Registro de instâncias LightRAG do processo, uma por (working_dir, workspace, storages).
+
+    A criação é preguiçosa e protegida por lock por chave: chamadas concorrentes
+    para o mesmo engine aguardam a mesma inicialização em vez de abrir novos
+    drivers/índices.
+    """
+
+    def __init__(self):
+        self._engines: Dict[EngineKey, LightRAG] = {}
+        self._locks: Dict[EngineKey, asyncio.Lock] = {}
+
+    @staticmethod
+    def _key(working_dir: str, workspace: str, storages: Dict[str, str]) -> EngineKey:
+        return os.path.abspath(working_dir), workspace, tuple(sorted(storages.items()))
+
+    async def get(self, working_dir: str, workspace: str = "", **storages: str) -> LightRAG:
+        """Retorna o engine da chave, inicializando-o na primeira chamada."""
+        config = {**DEFAULT_STORAGES, **storages}
+        key = self._key(working_dir, workspace, config)
+
+        rag = self._engines.get(key)
+        if rag is not None:
+            return rag
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            rag = self._engines.get(key)
+            if rag is None:
+                rag = await initialize_rag(working_dir, workspace=workspace, **config)
+                self._engines[key] = rag
+        return rag
+
+    async def health(self) -> Dict[str, dict]:
+        """
+        Verifica cada engine carregado: status dos documentos e, quando o
+        grafo expõe um driver (Neo4j), a conectividade com o servidor.
+        """
+        report = {}
+        for (working_dir, workspace, storages), rag in list(self._engines.items()):
+            name = f"{working_dir}|{workspace or '-'}|{dict(storages)['graph_storage']}"
+            try:
+                counts = await rag.doc_status.get_status_counts()
+                driver = getattr(rag.chunk_entity_relation_graph, "_driver", None)
+                if driver is not None:
+                    await driver.verify_connectivity()
+                report[name] = {"ok": True, "docs": counts}
+            except Exception as exc:
+                report[name] = {"ok": False, "error": str(exc)}
+        return report
+
+    async def shutdown(self) -> None:
+        """Finaliza os storages de todos os engines (fecha drivers e persiste índices)."""
+        engines = list(self._engines.values())
+        self._engines.clear()
+        self._locks.clear()
+        for rag in engines:
+            try:
+                await rag.finalize_storages()
+            except Exception as exc:
+                print(f"Aviso: falha ao finalizar engine LightRAG: {exc}")
+
+
+registry = RagEngineRegistry()
+
+
+async def get_rag(working_dir: str, workspace: str = "", **storages: str) -> LightRAG:
+    """Atalho para o registro global do processo."""
+    return await registry.get(working_dir, workspace, **storages)
+
@@ -0,0 +1,112 @@
+"""
+Extração de texto página a página, em streaming.
+
+As funções de nível de módulo rodam nos workers do pool de processos; este
+módulo importa apenas o PyMuPDF para que o spawn dos workers seja barato.
+"""
+import asyncio
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional, Tuple
+
+import fitz  # PyMuPDF
+
+# Páginas extraídas por tarefa e tarefas em voo por arquivo (limita a RSS)
+PAGES_PER_TASK = int(os.getenv("CARHELPER_PAGES_PER_TASK", "8"))
+MAX_PENDING_TASKS = int(os.getenv("CARHELPER_MAX_PENDING_TASKS", str(2 * (os.cpu_count() or 1))))
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+@dataclass
+class PageRecord:
+    file_path: str
+    page: int  # 1-based
+    text: str
+
+    @property
+    def source(self) -> str:
+        """Nome citável da página (fragmento padrão de PDFs), sem o diretório local."""
+        return f"{os.path.basename(self.file_path)}#page={self.page}"
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    """Pool de processos compartilhado para extração (criado no primeiro uso)."""
+    global _pool
+    if _pool is None:
+        workers = int(os.getenv("CARHELPER_EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+        _pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_extraction_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+def _page_count(file_path: str) -> int:
+    with fitz.open(file_path) as doc:
+        return doc.page_count
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    # Cada worker abre seu próprio handle do documento
+    with fitz.open(file_path) as doc:
+        return [(n + 1, doc[n].get_text()) for n in range(start, stop)]
+
+
+async def iter_pdf_pages(
+    file_path: str,
+    executor: Optional[Executor] = None,
+    pages_per_task: int = PAGES_PER_TASK,
+    max_pending: int = MAX_PENDING_TASKS,
+) -> AsyncIterator[PageRecord]:
+    """
+    Gera as páginas do PDF em ordem, extraindo faixas de páginas em paralelo.
+    No máximo `max_pending` faixas ficam em memória ao mesmo tempo.
+    """
+    loop = asyncio.get_running_loop()
+    executor = executor or get_extraction_pool()
+
+    total = await loop.run_in_executor(executor, _page_count, file_path)
+    pending = deque()
+
+    for start in range(0, total, pages_per_task):
+        stop = min(start + pages_per_task, total)
+        pending.append(loop.run_in_executor(executor, _extract_page_range, file_path, start, stop))
+
+        if len(pending) >= max_pending:
+            for page, text in await pending.popleft():
+                yield PageRecord(file_path, page, text)
+
+    while pending:
+        for page, text in await pending.popleft():
+            yield PageRecord(file_path, page, text)
+
+
+async def iter_text_sections(file_path: str, max_chars: int = 20000) -> AsyncIterator[PageRecord]:
+    """Arquivos de texto: seções de até `max_chars`, quebradas em linhas em branco."""
+    section, size, number = [], 0, 1
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            section.append(line)
+            size += len(line)
+            if size >= max_chars and not line.strip():
+                yield PageRecord(file_path, number, "".join(section))
+                section, size, number = [], 0, number + 1
+    if section:
+        yield PageRecord(file_path, number, "".join(section))
+
+
+def iter_file_pages(file_path: str, executor: Optional[Executor] = None) -> AsyncIterator[PageRecord]:
+    if file_path.lower().endswith(".pdf"):
+        return iter_pdf_pages(file_path, executor=executor)
+    return iter_text_sections(file_path)
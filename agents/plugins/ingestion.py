@@ -1,64 +1,147 @@
 import os
 from pathlib import Path
+from typing import List
 
 import nest_asyncio
 from dotenv import load_dotenv
 
 from lightrag import LightRAG
-from lightrag.llm.openai import gpt_4o_mini_complete, openai_embed
+from lightrag.llm.openai import gpt_4o_mini_complete
 from lightrag.kg.shared_storage import initialize_share_data, initialize_pipeline_status
-
-import fitz  # PyMuPDF
+from lightrag.utils import compute_mdhash_id
+
+from agents.plugins.extraction import PageRecord, iter_file_pages, shutdown_extraction_pool
+from agents.plugins.manifest import IngestionManifest, workspace_dir
+from agents.plugins.storage import register_storages
+from agents.plugins.telemetry import traced
+from agents.tools.config import (
+    EMBEDDING_BATCH_SIZE,
+    GRAPH_STORAGE,
+    KV_STORAGE,
+    VECTOR_INDEX_OPTIONS,
+    VECTOR_STORAGE,
+    configure_embedding,
+    embedding_signature,
+)
 
 nest_asyncio.apply()
 load_dotenv()
 
 
-async def initialize_rag(working_dir: str = "../database/rag_storage") -> LightRAG:
+register_storages()
+
+DEFAULT_STORAGES = {
+    "kv_storage": KV_STORAGE,
+    "graph_storage": GRAPH_STORAGE,
+    "vector_storage": VECTOR_STORAGE,
+}
+
+# Páginas por chamada de rag.ainsert durante a indexação
+INSERT_BATCH_PAGES = int(os.getenv("CARHELPER_INSERT_BATCH_PAGES", "16"))
+
+_shared_data_ready = False
+
+
+@traced("lightrag.initialize_rag")
+async def initialize_rag(working_dir: str = "../database/rag_storage", workspace: str = "", **storages: str) -> LightRAG:
+    """
+    Cria e inicializa uma instância LightRAG.
+    `workspace` isola os dados (subdiretório nos storages locais, label no Neo4j).
+    Prefira `agents.plugins.engine.get_rag`, que reaproveita a instância do processo.
+    """
+    global _shared_data_ready
+
     rag = LightRAG(
         working_dir=working_dir,
-        embedding_func=openai_embed,
+        workspace=workspace,
+        embedding_func=configure_embedding(),
+        embedding_batch_num=EMBEDDING_BATCH_SIZE,
         llm_model_func=gpt_4o_mini_complete,
-        graph_storage="Neo4JStorage",
-        vector_storage="FaissVectorDBStorage",
         chunk_token_size=1500,
-        chunk_overlap_token_size=300
+        chunk_overlap_token_size=300,
+        vector_db_storage_cls_kwargs=VECTOR_INDEX_OPTIONS,
+        **{**DEFAULT_STORAGES, **storages},
     )
     await rag.initialize_storages()
-    initialize_share_data()
+
+    # Dados compartilhados são globais do processo; o status do pipeline é idempotente
+    if not _shared_data_ready:
+        initialize_share_data()
+        _shared_data_ready = True
     await initialize_pipeline_status()
     return rag
 
 
-async def index_data(rag: LightRAG, file_path: str) -> None:
+@traced("lightrag.index_data")
+async def index_data(rag: LightRAG, file_path: str, batch_pages: int = INSERT_BATCH_PAGES) -> List[str]:
     """
-    Indexa UM arquivo (PDF ou texto) no LightRAG.
+    Indexa UM arquivo (PDF ou texto) no LightRAG, uma página por documento.
+    As páginas chegam em streaming e são inseridas em lotes de `batch_pages`,
+    com o caminho citável da página ("arquivo.pdf#page=N") como file_path.
+    Retorna os doc ids gerados (vazio se o arquivo não tiver texto).
     """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Arquivo não encontrado: {file_path}")
 
-    if file_path.lower().endswith(".pdf"):
-        text = ""
-        with fitz.open(file_path) as doc:
-            for page in doc:
-                text += page.get_text()
-    else:
-        with open(file_path, "r", encoding="utf-8") as f:
-            text = f.read()
-
-    if not text.strip():
+    doc_ids: List[str] = []
+    batch: List[PageRecord] = []
+
+    async def flush() -> None:
+        ids = [
+            compute_mdhash_id(f"{os.path.basename(r.file_path)}#{r.page}\n{r.text}", prefix="doc-")
+            for r in batch
+        ]
+        await rag.ainsert([r.text for r in batch], ids=ids, file_paths=[r.source for r in batch])
+        doc_ids.extend(ids)
+        batch.clear()
+
+    async for record in iter_file_pages(file_path):
+        if not record.text.strip():
+            continue
+        batch.append(record)
+        if len(batch) >= batch_pages:
+            await flush()
+
+    if batch:
+        await flush()
+
+    if not doc_ids:
         print(f"Aviso: {file_path} vazio ou não pôde ser lido.")
-        return
+        return []
 
-    await rag.ainsert(text)
-    print(f"Sucesso: {file_path} indexado com sucesso.")
+    print(f"Sucesso: {file_path} indexado com sucesso ({len(doc_ids)} páginas).")
+    return doc_ids
 
 
-async def index_file(rag: LightRAG, path: str) -> int:
+async def sync_file(rag: LightRAG, manifest: IngestionManifest, file_path: str, force: bool = False) -> bool:
+    """
+    Indexa o arquivo apenas se o hash ou o modelo de embeddings (nome ou
+    dimensão) mudou desde a última indexação. Documentos de versões anteriores
+    do arquivo são removidos do LightRAG.
+    Retorna True se o arquivo foi (re)indexado.
+    """
+    embedding = embedding_signature()
+    unchanged, entry, sha = manifest.check(file_path, embedding)
+    if unchanged and not force:
+        if entry.size != os.path.getsize(file_path) or entry.mtime != os.path.getmtime(file_path):
+            await manifest.touch(file_path)
+        return False
+
+    if entry is not None:
+        for doc_id in entry.doc_ids:
+            await rag.adelete_by_doc_id(doc_id)
+
+    doc_ids = await index_data(rag, file_path)
+    await manifest.record(file_path, sha, doc_ids, embedding)
+    return True
+
+
+async def index_file(rag: LightRAG, path: str, force: bool = False) -> int:
     """
     Indexa:
     - 1 arquivo, se 'path' for arquivo
     - todos os PDFs, se 'path' for diretório
+    Arquivos sem alteração (conforme o manifesto) são ignorados.
     Retorna quantidade de arquivos indexados.
     """
     p = Path(path)
@@ -66,10 +149,11 @@ async def index_file(rag: LightRAG, path: str) -> int:
     if not p.exists():
         raise FileNotFoundError(f"Caminho não encontrado: {path}")
 
+    manifest = IngestionManifest(workspace_dir(rag.working_dir, rag.workspace))
+
     # Caso 1: arquivo único
     if p.is_file():
-        await index_data(rag, str(p))
-        return 1
+        return int(await sync_file(rag, manifest, str(p), force=force))
 
     # Caso 2: diretório -> todos os PDFs (recursivo)
     pdf_files = sorted([f for f in p.rglob("*.pdf") if f.is_file()])
@@ -80,10 +164,31 @@ async def index_file(rag: LightRAG, path: str) -> int:
 
     count = 0
     for pdf in pdf_files:
-        await index_data(rag, str(pdf))
-        count += 1
+        count += int(await sync_file(rag, manifest, str(pdf), force=force))
 
-    print(f"Total de PDFs indexados: {count}")
+    print(f"Total de PDFs indexados: {count} (de {len(pdf_files)})")
     return count
 
 
+async def _main(paths: List[str], working_dir: str, workspace: str, force: bool) -> None:
+    rag = await initialize_rag(working_dir, workspace=workspace)
+    try:
+        for path in paths:
+            await index_file(rag, path, force=force)
+    finally:
+        await rag.finalize_storages()
+        shutdown_extraction_pool()
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Indexa manuais no LightRAG (pula arquivos inalterados).")
+    parser.add_argument("paths", nargs="+", help="Arquivos ou diretórios com PDFs")
+    parser.add_argument("--working-dir", default="database/rag_storage")
+    parser.add_argument("--workspace", default="", help="Namespace do manual (ex.: fordka, mobi)")
+    parser.add_argument("--force", action="store_true", help="Reindexa mesmo sem alterações")
+    args = parser.parse_args()
+
+    asyncio.run(_main(args.paths, args.working_dir, args.workspace, args.force))
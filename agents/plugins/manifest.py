@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+
+MANIFEST_NAME = "ingestion_manifest.json"
+
+
+def workspace_dir(working_dir: str, workspace: str = "") -> str:
+    """Diretório de dados do workspace, onde o manifesto é gravado."""
+    return os.path.join(working_dir, workspace) if workspace else working_dir
+
+
+@dataclass
+class ManifestEntry:
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+    doc_ids: List[str] = field(default_factory=list)
+    indexed_at: float = 0.0
+    # Modelo (backend/nome) e dimensão dos embeddings da indexação; vazios em
+    # manifestos antigos, que por isso são reindexados uma vez
+    embedding_model: str = ""
+    embedding_dim: int = 0
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestionManifest:
+    """
+    Registro dos arquivos já indexados em um diretório do LightRAG.
+
+    Cada arquivo guarda tamanho, mtime, hash do conteúdo, os doc ids gerados e
+    o modelo/dimensão dos embeddings, permitindo pular arquivos inalterados e
+    remover documentos antigos quando o arquivo ou o modelo de embeddings muda.
+    """
+
+    def __init__(self, working_dir: str):
+        self.path = os.path.join(working_dir, MANIFEST_NAME)
+        self._entries: Dict[str, ManifestEntry] = {}
+        self._lock = asyncio.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        self._entries = {key: ManifestEntry(**value) for key, value in raw.items()}
+
+    def _save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({k: asdict(v) for k, v in self._entries.items()}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def key(path: str) -> str:
+        return os.path.abspath(path)
+
+    def get(self, path: str) -> Optional[ManifestEntry]:
+        return self._entries.get(self.key(path))
+
+    def entries(self) -> List[ManifestEntry]:
+        return list(self._entries.values())
+
+    def check(self, path: str, embedding: Tuple[str, int]) -> tuple[bool, Optional[ManifestEntry], str]:
+        """
+        Retorna (inalterado, entrada_atual, sha256).
+        Inalterado exige o mesmo conteúdo e o mesmo `embedding` (modelo, dimensão).
+        Se tamanho e mtime batem, o hash não é recalculado.
+        """
+        stat = os.stat(path)
+        entry = self.get(path)
+        same_embedding = bool(entry and (entry.embedding_model, entry.embedding_dim) == tuple(embedding))
+        if entry and entry.size == stat.st_size and entry.mtime == stat.st_mtime:
+            return same_embedding, entry, entry.sha256
+
+        sha = file_sha256(path)
+        return bool(same_embedding and entry.sha256 == sha), entry, sha
+
+    async def record(self, path: str, sha256: str, doc_ids: List[str], embedding: Tuple[str, int]) -> ManifestEntry:
+        stat = os.stat(path)
+        entry = ManifestEntry(
+            path=self.key(path),
+            size=stat.st_size,
+            mtime=stat.st_mtime,
+            sha256=sha256,
+            doc_ids=list(doc_ids),
+            indexed_at=time.time(),
+            embedding_model=embedding[0],
+            embedding_dim=embedding[1],
+        )
+        async with self._lock:
+            self._entries[entry.path] = entry
+            self._save()
+        return entry
+
+    async def touch(self, path: str) -> None:
+        """Atualiza size/mtime de um arquivo cujo conteúdo não mudou."""
+        entry = self.get(path)
+        if entry is None:
+            return
+        stat = os.stat(path)
+        async with self._lock:
+            entry.size, entry.mtime = stat.st_size, stat.st_mtime
+            self._save()
+
+
+_read_cache: Dict[str, Tuple[float, IngestionManifest]] = {}
+
+
+def read_manifest(working_dir: str) -> IngestionManifest:
+    """Manifesto somente leitura, recarregado apenas quando o arquivo muda."""
+    manifest_path = os.path.join(working_dir, MANIFEST_NAME)
+    mtime = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else 0.0
+    cached = _read_cache.get(manifest_path)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, IngestionManifest(working_dir))
+        _read_cache[manifest_path] = cached
+    return cached[1]
@@ -0,0 +1,24 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+# Fila de progresso do turno atual. Tasks criadas dentro do turno (inclusive
+# as do AgentTool e do asyncio.gather das buscas) herdam o mesmo canal.
+_channel: ContextVar[Optional[asyncio.Queue]] = ContextVar("carhelper_progress", default=None)
+
+
+@contextmanager
+def progress_channel(queue: asyncio.Queue) -> Iterator[asyncio.Queue]:
+    token = _channel.set(queue)
+    try:
+        yield queue
+    finally:
+        _channel.reset(token)
+
+
+def report(message: str) -> None:
+    """Publica uma mensagem de progresso; sem canal ativo (sem streaming), não faz nada."""
+    queue = _channel.get()
+    if queue is not None:
+        queue.put_nowait(message)
@@ -1,13 +1,155 @@
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sequence
 
 from lightrag import LightRAG, QueryParam
 
-async def run_async_query(rag: LightRAG, question: str, mode: str, top_k: int = 5) -> str:
+from agents.plugins.answer_cache import normalize_query
+from agents.plugins.telemetry import cache_result, span
+
+
+class RetrievalCache:
+    """
+    Cache LRU em memória para resultados de rag.aquery, com TTL e limite
+    de entradas e de bytes (tamanho aproximado das strings armazenadas).
+    """
+
+    def __init__(self, ttl_seconds: float = 600, max_entries: int = 512, max_bytes: int = 32 * 1024 * 1024):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._data: "OrderedDict[Hashable, tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: Hashable) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None or time.monotonic() - item[0] > self.ttl_seconds:
+            if item is not None:
+                self._drop(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key: Hashable, value: str) -> None:
+        if key in self._data:
+            self._drop(key)
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return
+        self._data[key] = (time.monotonic(), value)
+        self._bytes += size
+        while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            self._drop(next(iter(self._data)))
+
+    def _drop(self, key: Hashable) -> None:
+        _, value = self._data.pop(key)
+        self._bytes -= sys.getsizeof(value)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "entries": len(self._data),
+            "bytes": self._bytes,
+        }
+
+
+class _Flight:
+    """Consulta em andamento compartilhada e quantos chamadores ainda a esperam."""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[str]"):
+        self.task = task
+        self.waiters = 0
+
+
+retrieval_cache = RetrievalCache()
+_inflight: Dict[Hashable, _Flight] = {}
+
+
+def _forget(key: Hashable, flight: _Flight) -> None:
+    if _inflight.get(key) is flight:
+        del _inflight[key]
+
+
+async def _aquery(rag: LightRAG, question: str, param: QueryParam) -> str:
+    with span("rag.aquery", workspace=getattr(rag, "workspace", ""), mode=param.mode, top_k=param.top_k):
+        return await rag.aquery(question, param=param)
+
+
+async def run_async_query(
+    rag: LightRAG,
+    question: str,
+    mode: str,
+    top_k: int = 5,
+    only_need_context: bool = False,
+    manuals: Sequence[str] = (),
+    use_cache: bool = True,
+) -> str:
     """
     Execute an async RAG query using .aquery
+
+    Results are cached per (engine, mode, top_k, only_need_context, normalized
+    question, manuals); `manuals` should identify the manual set and its
+    version so reindexing invalidates the entry. Identical concurrent queries
+    share a single in-flight .aquery call. With `only_need_context=True`
+    LightRAG returns the retrieved context without generating an answer.
     """
-    return await rag.aquery(
-        question,
-        param=QueryParam(mode=mode, top_k=top_k)
+    param = QueryParam(mode=mode, top_k=top_k, only_need_context=only_need_context)
+    if not use_cache:
+        return await _aquery(rag, question, param)
+
+    key = (
+        rag.working_dir,
+        getattr(rag, "workspace", ""),
+        mode,
+        top_k,
+        only_need_context,
+        normalize_query(question),
+        tuple(sorted(manuals)),
     )
 
+    cached = retrieval_cache.get(key)
+    if cached is not None:
+        cache_result("retrieval", "hit")
+        return cached
+
+    flight = _inflight.get(key)
+    if flight is None:
+        cache_result("retrieval", "miss")
+
+        async def query() -> str:
+            result = await _aquery(rag, question, param)
+            retrieval_cache.put(key, result)
+            return result
+
+        flight = _inflight[key] = _Flight(asyncio.ensure_future(query()))
+        flight.task.add_done_callback(lambda _, f=flight: _forget(key, f))
+    else:
+        retrieval_cache.coalesced += 1
+        cache_result("retrieval", "coalesced")
 
+    flight.waiters += 1
+    try:
+        # shield: o cancelamento de um chamador não cancela os demais
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # O último chamador desistiu (bloqueio da triagem, timeout): a consulta
+            # ao LightRAG é cancelada em vez de seguir gastando LLM e embeddings
+            _forget(key, flight)
+            flight.task.cancel()
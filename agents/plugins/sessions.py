@@ -0,0 +1,382 @@
+"""
+Serviço de sessões do ADK ajustado para carga concorrente.
+
+- SQLite em WAL (leitores não bloqueiam o escritor), busy_timeout e pool de conexões;
+- os eventos de um turno ficam em memória e são gravados numa única transação
+  no fim do turno (flush_turn, inclusive se o cliente desconectar) em vez de
+  uma transação por evento;
+- chaves intermediárias do loop de qualidade (rascunhos, revisões, flags) usam
+  o prefixo `temp:` do ADK: valem só durante o turno e não são persistidas;
+- compact_sessions() apaga sessões sem atividade há mais de SESSION_TTL_SECONDS.
+
+    python -m agents.plugins.sessions --compact [--vacuum]
+"""
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.errors._stale_session_error import StaleSessionError
+from google.adk.errors.session_not_found_error import SessionNotFoundError
+from google.adk.events import Event
+from google.adk.plugins.base_plugin import BasePlugin
+from google.adk.sessions import _session_util
+from google.adk.sessions.database_session_service import DatabaseSessionService
+from google.adk.sessions.session import Session
+
+from agents.tools.config import (
+    SESSION_BATCHED,
+    SESSION_BUSY_TIMEOUT_MS,
+    SESSION_COMPACT_INTERVAL,
+    SESSION_DB_URL,
+    SESSION_POOL_SIZE,
+    SESSION_TTL_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Acima disso os eventos pendentes de uma sessão são gravados mesmo no meio do turno
+MAX_PENDING_EVENTS = 200
+
+SessionKey = Tuple[str, str, str]
+
+
+def _sqlite_pragmas(busy_timeout_ms: int):
+    def on_connect(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Em WAL, NORMAL só sincroniza no checkpoint: seguro contra corrupção, bem mais rápido
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+        # Só vale para bancos novos; nos antigos, rode --vacuum uma vez
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.close()
+
+    return on_connect
+
+
+class BatchedSessionService(DatabaseSessionService):
+    """
+    DatabaseSessionService que acumula os eventos de cada sessão e grava o
+    lote numa transação só (flush_session). Leituras da sessão gravam antes
+    o que estiver pendente, então quem lê nunca vê um histórico atrasado.
+    """
+
+    def __init__(self, db_url: str, batched: bool = True, busy_timeout_ms: int = SESSION_BUSY_TIMEOUT_MS, **kwargs: Any):
+        from sqlalchemy import event as sa_event
+        from sqlalchemy.engine import make_url
+
+        url = make_url(db_url)
+        sqlite_file = url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+        if sqlite_file:
+            # O aiosqlite também espera o lock por conta própria (segundos)
+            connect_args = dict(kwargs.pop("connect_args", {}))
+            connect_args.setdefault("timeout", busy_timeout_ms / 1000)
+            kwargs["connect_args"] = connect_args
+        super().__init__(db_url=db_url, **kwargs)
+        if sqlite_file:
+            sa_event.listen(self.db_engine.sync_engine, "connect", _sqlite_pragmas(busy_timeout_ms))
+
+        self.batched = batched
+        self._pending: Dict[SessionKey, Tuple[Session, List[Event]]] = {}
+        self._flush_locks: Dict[SessionKey, asyncio.Lock] = {}
+
+    # -- escrita ---------------------------------------------------------
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        if not self.batched:
+            return await super().append_event(session, event)
+
+        key = (session.app_name, session.user_id, session.id)
+        pending = self._pending.get(key)
+        if pending is not None and (pending[0] is not session or pending[1][-1].invocation_id != event.invocation_id):
+            # Outro turno (ou outro objeto de sessão): o lote anterior vai primeiro
+            await self.flush_session(pending[0])
+            pending = None
+
+        self._apply_temp_state(session, event)
+        event = self._trim_temp_delta_state(event)
+        if pending is None:
+            pending = self._pending[key] = (session, [])
+        pending[1].append(event)
+        self._commit_event_to_session(session, event)
+
+        if len(pending[1]) >= MAX_PENDING_EVENTS:
+            await self.flush_session(session)
+        return event
+
+    async def flush_session(self, session: Session) -> int:
+        """Grava os eventos pendentes da sessão numa transação; devolve quantos."""
+        key = (session.app_name, session.user_id, session.id)
+        lock = self._flush_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                pending = self._pending.pop(key, None)
+                if not pending or not pending[1]:
+                    return 0
+                try:
+                    try:
+                        await self._write_events(*pending)
+                    except StaleSessionError:
+                        # Outro worker gravou a sessão depois que ela foi carregada. Os
+                        # eventos do turno são novos: entram depois dos dele (o estado é
+                        # mesclado chave a chave) em vez de o turno inteiro se perder
+                        logger.warning(
+                            "Sessão %s alterada por outro processo; gravando %d eventos "
+                            "(invocação %s) sobre a versão atual",
+                            session.id, len(pending[1]), pending[1][-1].invocation_id,
+                        )
+                        await self._write_events(*pending, rebase=True)
+                except Exception:
+                    # Devolve o lote para a próxima tentativa (o próximo flush ou leitura)
+                    current = self._pending.get(key)
+                    self._pending[key] = (pending[0], pending[1] + (current[1] if current else []))
+                    raise
+                return len(pending[1])
+        finally:
+            if key not in self._pending and not lock.locked():
+                self._flush_locks.pop(key, None)
+
+    async def flush(self) -> None:
+        for session, _ in list(self._pending.values()):
+            await self.flush_session(session)
+
+    async def _write_events(self, session: Session, events: List[Event], rebase: bool = False) -> None:
+        """
+        Mesmo fluxo do DatabaseSessionService.append_event (verificação de sessão
+        desatualizada, merge do estado, atualização do update_time), para o lote
+        inteiro numa transação. Com `rebase`, grava sem a verificação.
+        """
+        from sqlalchemy import select
+
+        await self.prepare_tables()
+        schema = self._get_schema_classes()
+        row_lock = self._supports_row_level_locking()
+
+        deltas: Dict[str, Dict[str, Any]] = {"app": {}, "user": {}, "session": {}}
+        for event in events:
+            if event.actions and event.actions.state_delta:
+                for scope, values in _session_util.extract_json_safe_state_delta(event.actions.state_delta).items():
+                    deltas[scope].update(values)
+
+        async with self._with_session_lock(app_name=session.app_name, user_id=session.user_id, session_id=session.id):
+            async with self._rollback_on_exception_session() as sql_session:
+                stmt = select(schema.StorageSession).filter(
+                    schema.StorageSession.app_name == session.app_name,
+                    schema.StorageSession.user_id == session.user_id,
+                    schema.StorageSession.id == session.id,
+                )
+                if row_lock:
+                    stmt = stmt.with_for_update()
+                storage_session = (await sql_session.execute(stmt)).scalars().one_or_none()
+                if storage_session is None:
+                    raise SessionNotFoundError(f"Session {session.id} not found.")
+                if not rebase and not await self._matches_storage(sql_session, schema, session, storage_session, events):
+                    raise StaleSessionError(
+                        "The session has been modified in storage since it was loaded. "
+                        "Please reload the session before appending more events."
+                    )
+
+                if deltas["app"]:
+                    stmt = select(schema.StorageAppState).filter(schema.StorageAppState.app_name == session.app_name)
+                    app_state = (await sql_session.execute(stmt.with_for_update() if row_lock else stmt)).scalars().one()
+                    app_state.state.update(deltas["app"])
+                if deltas["user"]:
+                    stmt = select(schema.StorageUserState).filter(
+                        schema.StorageUserState.app_name == session.app_name,
+                        schema.StorageUserState.user_id == session.user_id,
+                    )
+                    user_state = (await sql_session.execute(stmt.with_for_update() if row_lock else stmt)).scalars().one()
+                    user_state.state.update(deltas["user"])
+                if deltas["session"]:
+                    storage_session.state.update(deltas["session"])
+
+                update_time = datetime.fromtimestamp(events[-1].timestamp, timezone.utc)
+                if self._uses_naive_datetime():
+                    update_time = update_time.replace(tzinfo=None)
+                storage_session.update_time = update_time
+                sql_session.add_all([schema.StorageEvent.from_event(session, event) for event in events])
+
+                last_update_time = storage_session.get_update_timestamp()
+                marker = storage_session.get_update_marker()
+                await sql_session.commit()
+
+        session.last_update_time = last_update_time
+        session._storage_update_marker = marker
+
+    async def _matches_storage(self, sql_session, schema, session: Session, storage_session, events: List[Event]) -> bool:
+        """
+        Se a sessão em memória ainda é a versão gravada: pelo marcador de revisão
+        ou, em sessões sem marcador, pelo último evento já persistido (o mesmo
+        fallback do DatabaseSessionService).
+        """
+        if session._storage_update_marker is not None:
+            return session._storage_update_marker == storage_session.get_update_marker()
+        if storage_session.get_update_timestamp() <= session.last_update_time:
+            return True
+        # Os eventos do lote já estão em session.events, mas ainda não no banco
+        persisted = session.model_copy(update={"events": session.events[: len(session.events) - len(events)]})
+        return await self._session_matches_storage_revision(sql_session=sql_session, schema=schema, session=persisted)
+
+    # -- leitura: sempre depois do que estiver pendente ------------------
+
+    async def _flush_matching(self, app_name: str, user_id: Optional[str] = None, session_id: Optional[str] = None) -> None:
+        for (app, user, sid), (session, _) in list(self._pending.items()):
+            if app == app_name and user_id in (None, user) and session_id in (None, sid):
+                await self.flush_session(session)
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str, config=None) -> Optional[Session]:
+        await self._flush_matching(app_name, user_id, session_id)
+        return await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None):
+        await self._flush_matching(app_name, user_id)
+        return await super().list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, app_name: str, user_id: str, session_id: str) -> None:
+        self._pending.pop((app_name, user_id, session_id), None)
+        await super().delete_session(app_name, user_id, session_id)
+
+    # -- compactação -----------------------------------------------------
+
+    async def compact(self, ttl_seconds: float = SESSION_TTL_SECONDS, vacuum: bool = False) -> int:
+        """Apaga sessões (e seus eventos) sem atividade há mais de `ttl_seconds`."""
+        from sqlalchemy import delete, exists, text
+
+        await self.flush()
+        await self.prepare_tables()
+        schema = self._get_schema_classes()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=ttl_seconds)
+        if self._uses_naive_datetime():
+            cutoff = cutoff.replace(tzinfo=None)
+
+        sessions, events = schema.StorageSession, schema.StorageEvent
+        async with self._rollback_on_exception_session() as sql_session:
+            # A chave da sessão é (app_name, user_id, id): o id sozinho pode se repetir
+            # entre usuários. Os eventos saem junto com a sessão, pela chave inteira
+            result = await sql_session.execute(delete(sessions).where(sessions.update_time < cutoff))
+            removed = result.rowcount
+            if removed:
+                owner = exists().where(
+                    sessions.app_name == events.app_name,
+                    sessions.user_id == events.user_id,
+                    sessions.id == events.session_id,
+                )
+                await sql_session.execute(delete(events).where(~owner))
+            await sql_session.commit()
+
+        if self.db_engine.dialect.name == "sqlite":
+            # VACUUM não roda dentro de transação: conexão em autocommit
+            async with self.db_engine.connect() as conn:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+                await conn.execute(text("VACUUM" if vacuum else "PRAGMA incremental_vacuum"))
+                await conn.execute(text("PRAGMA wal_checkpoint(TRUNCATE)"))
+        return removed
+
+
+async def _flush_logged(service: BatchedSessionService, session: Session) -> None:
+    try:
+        await service.flush_session(session)
+    except Exception:
+        logger.exception("Eventos do turno não gravados (sessão %s)", session.id)
+
+
+async def flush_turn(invocation_context) -> None:
+    """
+    Grava o lote de eventos do turno. Chamado no `finally` do agente raiz:
+    quando o cliente desconecta (SSE), o Runner é fechado sem after_run e
+    o cancelamento não interrompe a gravação, que segue em segundo plano.
+    """
+    service = invocation_context.session_service
+    if isinstance(service, BatchedSessionService):
+        await asyncio.shield(asyncio.ensure_future(_flush_logged(service, invocation_context.session)))
+
+
+class SessionFlushPlugin(BasePlugin):
+    """Grava o lote de eventos do turno quando o Runner termina (ou falha)."""
+
+    def __init__(self):
+        super().__init__(name="carhelper_session_flush")
+
+    async def after_run_callback(self, *, invocation_context):
+        await flush_turn(invocation_context)
+
+    async def on_run_error_callback(self, *, invocation_context, error):
+        await flush_turn(invocation_context)
+        return None
+
+
+_services: List[BatchedSessionService] = []
+
+
+def session_db_kwargs() -> Dict[str, Any]:
+    """Argumentos do engine SQLAlchemy (pool) para get_fast_api_app."""
+    return {"pool_size": SESSION_POOL_SIZE, "max_overflow": SESSION_POOL_SIZE, "pool_timeout": 30}
+
+
+def register_session_service() -> None:
+    """Faz o ADK criar BatchedSessionService para URLs sqlite+aiosqlite:// e postgresql+asyncpg://."""
+    from google.adk.cli.service_registry import get_service_registry
+
+    def factory(uri: str, **kwargs: Any) -> BatchedSessionService:
+        kwargs.pop("agents_dir", None)
+        service = BatchedSessionService(db_url=uri, batched=SESSION_BATCHED, **kwargs)
+        _services.append(service)
+        return service
+
+    registry = get_service_registry()
+    for scheme in ("sqlite+aiosqlite", "postgresql+asyncpg"):
+        registry.register_session_service(scheme, factory)
+
+
+async def compact_sessions(ttl_seconds: float = SESSION_TTL_SECONDS, vacuum: bool = False) -> int:
+    """Compacta os serviços criados por register_session_service; devolve as sessões apagadas."""
+    removed = 0
+    for service in _services:
+        removed += await service.compact(ttl_seconds, vacuum=vacuum)
+    return removed
+
+
+async def flush_sessions() -> None:
+    """Grava os eventos pendentes de todos os serviços (desligamento do servidor)."""
+    for service in _services:
+        await service.flush()
+
+
+async def compaction_loop(interval: float = SESSION_COMPACT_INTERVAL) -> None:
+    """Tarefa de fundo do servidor: compacta as sessões a cada `interval` segundos."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await compact_sessions()
+            if removed:
+                logger.info("Sessões expiradas removidas: %d", removed)
+        except Exception:
+            logger.exception("Falha na compactação das sessões")
+
+
+async def _main(url: str, ttl_seconds: float, vacuum: bool) -> None:
+    service = BatchedSessionService(db_url=url)
+    try:
+        removed = await service.compact(ttl_seconds, vacuum=vacuum)
+        logger.info("Sessões removidas: %d", removed)
+    finally:
+        await service.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Manutenção do banco de sessões do CarHelper.")
+    parser.add_argument("--compact", action="store_true", help="Apaga sessões sem atividade além do TTL")
+    parser.add_argument("--vacuum", action="store_true", help="Roda VACUUM completo (SQLite) após compactar")
+    parser.add_argument("--ttl", type=float, default=SESSION_TTL_SECONDS, help="TTL em segundos")
+    parser.add_argument("--url", default=SESSION_DB_URL)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.compact or args.vacuum:
+        asyncio.run(_main(args.url, args.ttl, args.vacuum))
+    else:
+        parser.print_help()
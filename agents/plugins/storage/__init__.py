@@ -0,0 +1,23 @@
+from lightrag.kg import STORAGES, STORAGE_ENV_REQUIREMENTS, STORAGE_IMPLEMENTATIONS
+
+# Nome do storage -> (tipo no LightRAG, módulo da implementação)
+CUSTOM_STORAGES = {
+    "ShardedFaissVectorDBStorage": ("VECTOR_STORAGE", "agents.plugins.storage.faiss_sharded"),
+    "SQLiteKVStorage": ("KV_STORAGE", "agents.plugins.storage.sqlite_kv"),
+    "PooledNeo4JStorage": ("GRAPH_STORAGE", "agents.plugins.storage.neo4j_pooled"),
+}
+
+# Variáveis de ambiente exigidas pelo LightRAG ao selecionar o storage
+ENV_REQUIREMENTS = {
+    "PooledNeo4JStorage": ["NEO4J_URI", "NEO4J_USERNAME", "NEO4J_PASSWORD"],
+}
+
+
+def register_storages() -> None:
+    """Registra os storages deste projeto para serem usados pelo nome no LightRAG."""
+    for name, (storage_type, module) in CUSTOM_STORAGES.items():
+        STORAGES[name] = module
+        implementations = STORAGE_IMPLEMENTATIONS[storage_type]["implementations"]
+        if name not in implementations:
+            implementations.append(name)
+        STORAGE_ENV_REQUIREMENTS[name] = ENV_REQUIREMENTS.get(name, [])
@@ -0,0 +1,408 @@
+import asyncio
+import glob
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple, final
+
+import faiss
+import numpy as np
+
+from lightrag.base import BaseVectorStorage
+from lightrag.utils import compute_mdhash_id, logger
+
+# Leitura somente-leitura com mmap: workers compartilham as páginas do índice
+MMAP_FLAGS = faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+
+
+@final
+@dataclass
+class ShardedFaissVectorDBStorage(BaseVectorStorage):
+    """
+    Storage vetorial FAISS em shards append-only, abertos via mmap.
+
+    - Cada flush (index_done_callback) grava os vetores novos em um shard
+      próprio (`shard-NNNNNN.index`); shards existentes nunca são reescritos.
+    - Metadados, vetores e o mapeamento id -> fid ficam em SQLite (WAL).
+      Remoções apagam a linha; o vetor órfão no shard é ignorado na busca e
+      descartado na próxima compactação.
+    - Acima de `max_shards`, os vetores vivos são compactados em um shard só.
+    - Outros processos percebem novos shards pelo `PRAGMA data_version`.
+    - Gravar, compactar e remover órfãos acontece sob o lock de escrita do
+      SQLite (BEGIN IMMEDIATE), que vale entre processos: um shard só existe
+      sem registro enquanto o processo que o grava detém esse lock.
+
+    Opções em `vector_db_storage_cls_kwargs`:
+      index_type: "flat" (exato), "hnsw" ou "ivf"
+      hnsw_m, ef_construction, ef_search: parâmetros do HNSW
+      ivf_nlist, nprobe: parâmetros do IVF (nlist é limitado pelo tamanho do shard)
+      max_shards: limite de shards antes da compactação
+    """
+
+    def __post_init__(self):
+        self._validate_embedding_func()
+        kwargs = self.global_config.get("vector_db_storage_cls_kwargs", {})
+        self.cosine_better_than_threshold = kwargs.get("cosine_better_than_threshold", 0.2)
+        self._index_type = kwargs.get("index_type", "flat")
+        self._hnsw_m = int(kwargs.get("hnsw_m", 32))
+        self._ef_construction = int(kwargs.get("ef_construction", 200))
+        self._ef_search = int(kwargs.get("ef_search", 64))
+        self._ivf_nlist = int(kwargs.get("ivf_nlist", 256))
+        self._nprobe = int(kwargs.get("nprobe", 16))
+        self._max_shards = int(kwargs.get("max_shards", 16))
+
+        working_dir = self.global_config["working_dir"]
+        base_dir = os.path.join(working_dir, self.workspace) if self.workspace else working_dir
+        self._dir = os.path.join(base_dir, f"faiss_shards_{self.namespace}")
+        os.makedirs(self._dir, exist_ok=True)
+
+        self._dim = self.embedding_func.embedding_dim
+        self._max_batch_size = self.global_config["embedding_batch_num"]
+
+        # Uma compactação grande segura o lock de escrita por alguns segundos
+        self._conn = sqlite3.connect(os.path.join(self._dir, "meta.db"), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            " fid INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " id TEXT NOT NULL UNIQUE,"
+            " shard INTEGER NOT NULL,"
+            " created_at INTEGER,"
+            " src_id TEXT,"
+            " tgt_id TEXT,"
+            " meta TEXT NOT NULL,"
+            " vector BLOB NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS vectors_src ON vectors (src_id);"
+            "CREATE INDEX IF NOT EXISTS vectors_tgt ON vectors (tgt_id);"
+            "CREATE TABLE IF NOT EXISTS shards (shard INTEGER PRIMARY KEY, file TEXT NOT NULL, ntotal INTEGER NOT NULL);"
+        )
+        self._conn.commit()
+
+        # Escritas ainda não materializadas em shard: id -> registro (com "content")
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_deletes: Set[str] = set()
+        self._shards: Dict[int, faiss.Index] = {}
+        self._data_version: Optional[int] = None
+        self._lock = asyncio.Lock()
+        try:
+            self._reap_orphan_files()
+        except sqlite3.OperationalError as e:
+            # Outro processo segurou o lock de escrita além do timeout; os órfãos ficam para depois
+            logger.warning(f"[{self.workspace}] {self.namespace}: limpeza de shards órfãos adiada ({e})")
+        self._load_shards()
+
+    async def initialize(self):
+        pass
+
+    # ------------------------------------------------------------------ shards
+
+    def _shard_path(self, shard: int) -> str:
+        return os.path.join(self._dir, f"shard-{shard:06d}.index")
+
+    def _reap_orphan_files(self) -> None:
+        """
+        Remove arquivos temporários e shards que nunca foram registrados.
+        Roda sob o lock de escrita: com ele, nenhum outro processo está no meio
+        de gravar um shard, então todo arquivo sem registro é de fato órfão.
+        """
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            known = {row[0] for row in self._conn.execute("SELECT file FROM shards")}
+            for path in glob.glob(os.path.join(self._dir, "shard-*.index*")):
+                if os.path.basename(path) not in known:
+                    os.remove(path)
+        finally:
+            self._conn.rollback()
+
+    def _configure_search(self, index: faiss.Index) -> None:
+        base = faiss.downcast_index(index.index) if hasattr(index, "index") else index
+        if hasattr(base, "hnsw"):
+            base.hnsw.efSearch = self._ef_search
+        if hasattr(base, "nprobe"):
+            base.nprobe = self._nprobe
+
+    def _load_shards(self) -> None:
+        rows = self._conn.execute("SELECT shard, file FROM shards ORDER BY shard").fetchall()
+        loaded = {}
+        for shard, file in rows:
+            index = self._shards.get(shard)
+            if index is None:
+                index = faiss.read_index(os.path.join(self._dir, file), MMAP_FLAGS)
+                self._configure_search(index)
+            loaded[shard] = index
+        self._shards = loaded
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _refresh_if_stale(self) -> None:
+        # data_version só muda quando OUTRA conexão confirma uma transação
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._load_shards()
+
+    def _build_index(self, vectors: np.ndarray, fids: np.ndarray) -> faiss.Index:
+        n = len(vectors)
+        if self._index_type == "hnsw":
+            base = faiss.IndexHNSWFlat(self._dim, self._hnsw_m, faiss.METRIC_INNER_PRODUCT)
+            base.hnsw.efConstruction = self._ef_construction
+        elif self._index_type == "ivf" and n >= 39:
+            # ~39 pontos por centróide é o mínimo que o k-means do FAISS aceita sem aviso
+            nlist = max(1, min(self._ivf_nlist, n // 39))
+            base = faiss.IndexIVFFlat(faiss.IndexFlatIP(self._dim), self._dim, nlist, faiss.METRIC_INNER_PRODUCT)
+            base.train(vectors)
+        else:
+            base = faiss.IndexFlatIP(self._dim)
+        index = faiss.IndexIDMap2(base)
+        index.add_with_ids(vectors, fids)
+        return index
+
+    def _write_shard(self, shard: int, vectors: np.ndarray, fids: np.ndarray) -> str:
+        path = self._shard_path(shard)
+        tmp_path = f"{path}.tmp"
+        faiss.write_index(self._build_index(vectors, fids), tmp_path)
+        os.replace(tmp_path, path)
+        return os.path.basename(path)
+
+    def _next_shard(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(MAX(shard), -1) + 1 FROM shards").fetchone()
+        return row[0]
+
+    # ------------------------------------------------------------------ escrita
+
+    async def upsert(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """Bufferiza os registros; embedding e gravação acontecem no flush."""
+        if not data:
+            return
+        now = int(time.time())
+        async with self._lock:
+            for doc_id, value in data.items():
+                self._pending_deletes.discard(doc_id)
+                self._pending[doc_id] = {
+                    "__id__": doc_id,
+                    "__created_at__": now,
+                    **{mf: value[mf] for mf in self.meta_fields if mf in value},
+                    "content": value["content"],
+                }
+
+    async def _embed(self, contents: List[str]) -> np.ndarray:
+        batches = [
+            contents[i:i + self._max_batch_size]
+            for i in range(0, len(contents), self._max_batch_size)
+        ]
+        vectors = np.concatenate(
+            await asyncio.gather(*(self.embedding_func(batch) for batch in batches)), axis=0
+        ).astype(np.float32)
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    async def _flush_locked(self) -> None:
+        if not self._pending and not self._pending_deletes:
+            return
+
+        pending = list(self._pending.values())
+        vectors = await self._embed([r["content"] for r in pending]) if pending else None
+
+        removed = list(self._pending_deletes | set(self._pending))
+        cur = self._conn.cursor()
+        try:
+            # O número do shard e o arquivo são decididos já com o lock de escrita
+            cur.execute("BEGIN IMMEDIATE")
+            shard = self._next_shard()
+            for start in range(0, len(removed), 500):
+                chunk = removed[start:start + 500]
+                cur.execute(f"DELETE FROM vectors WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+
+            if pending:
+                fids = []
+                for record, vector in zip(pending, vectors):
+                    meta = {k: v for k, v in record.items() if k != "content" or "content" in self.meta_fields}
+                    cur.execute(
+                        "INSERT INTO vectors (id, shard, created_at, src_id, tgt_id, meta, vector)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            record["__id__"],
+                            shard,
+                            record["__created_at__"],
+                            record.get("src_id"),
+                            record.get("tgt_id"),
+                            json.dumps(meta, ensure_ascii=False),
+                            vector.tobytes(),
+                        ),
+                    )
+                    fids.append(cur.lastrowid)
+                # O arquivo é gravado antes do commit; se o processo cair antes,
+                # ele vira órfão e é removido na próxima abertura
+                file = self._write_shard(shard, vectors, np.asarray(fids, dtype=np.int64))
+                cur.execute("INSERT INTO shards (shard, file, ntotal) VALUES (?, ?, ?)", (shard, file, len(fids)))
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+
+        self._pending.clear()
+        self._pending_deletes.clear()
+
+        if self._conn.execute("SELECT COUNT(*) FROM shards").fetchone()[0] > self._max_shards:
+            self._compact_locked()
+        self._load_shards()
+
+    def _compact_locked(self) -> None:
+        """Reescreve todos os vetores vivos em um único shard."""
+        cur = self._conn.cursor()
+        try:
+            cur.execute("BEGIN IMMEDIATE")
+            rows = cur.execute("SELECT fid, vector FROM vectors ORDER BY fid").fetchall()
+            old_files = [row[0] for row in cur.execute("SELECT file FROM shards")]
+            shard = self._next_shard()
+            cur.execute("DELETE FROM shards")
+            if rows:
+                fids = np.asarray([r[0] for r in rows], dtype=np.int64)
+                vectors = np.vstack([np.frombuffer(r[1], dtype=np.float32) for r in rows])
+                file = self._write_shard(shard, vectors, fids)
+                cur.execute("INSERT INTO shards (shard, file, ntotal) VALUES (?, ?, ?)", (shard, file, len(rows)))
+            cur.execute("UPDATE vectors SET shard = ?", (shard,))
+            self._conn.commit()
+        except Exception:
+            self._conn.rollback()
+            raise
+
+        # Leitores com mmap aberto continuam válidos até reabrir (o inode persiste)
+        self._shards.clear()
+        for file in old_files:
+            path = os.path.join(self._dir, file)
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"[{self.workspace}] {self.namespace}: {len(old_files)} shards compactados em 1")
+
+    async def index_done_callback(self) -> bool:
+        async with self._lock:
+            await self._flush_locked()
+        return True
+
+    async def delete(self, ids: List[str]) -> None:
+        async with self._lock:
+            for doc_id in ids:
+                self._pending.pop(doc_id, None)
+                self._pending_deletes.add(doc_id)
+
+    async def delete_entity(self, entity_name: str) -> None:
+        await self.delete([compute_mdhash_id(entity_name, prefix="ent-")])
+
+    async def delete_entity_relation(self, entity_name: str) -> None:
+        rows = self._conn.execute(
+            "SELECT id FROM vectors WHERE src_id = ? OR tgt_id = ?", (entity_name, entity_name)
+        ).fetchall()
+        ids = [r[0] for r in rows]
+        ids += [
+            doc_id for doc_id, record in self._pending.items()
+            if entity_name in (record.get("src_id"), record.get("tgt_id"))
+        ]
+        await self.delete(ids)
+
+    # ------------------------------------------------------------------ leitura
+
+    async def query(self, query: str, top_k: int, query_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """Busca nos shards já gravados (escritas pendentes não entram, como no FaissVectorDBStorage)."""
+        if query_embedding is not None:
+            embedding = np.array([query_embedding], dtype=np.float32)
+        else:
+            embedding = np.array(await self.embedding_func([query], context="query"), dtype=np.float32)
+        faiss.normalize_L2(embedding)
+
+        self._refresh_if_stale()
+        candidates: List[Tuple[float, int]] = []
+        # Busca um pouco além de top_k para compensar vetores já removidos
+        fetch = top_k * 2
+        for index in self._shards.values():
+            distances, fids = index.search(embedding, min(fetch, index.ntotal))
+            candidates.extend(
+                (float(d), int(f)) for d, f in zip(distances[0], fids[0])
+                if f != -1 and d >= self.cosine_better_than_threshold
+            )
+        if not candidates:
+            return []
+
+        candidates.sort(reverse=True)
+        candidates = candidates[:fetch]
+        placeholders = ",".join("?" * len(candidates))
+        rows = self._conn.execute(
+            f"SELECT fid, meta FROM vectors WHERE fid IN ({placeholders})", [f for _, f in candidates]
+        ).fetchall()
+        metas = {fid: json.loads(meta) for fid, meta in rows}
+
+        results = []
+        for distance, fid in candidates:
+            meta = metas.get(fid)
+            if meta is None:
+                continue
+            results.append({**self._format(meta), "distance": distance})
+            if len(results) >= top_k:
+                break
+        return results
+
+    @staticmethod
+    def _format(meta: Dict[str, Any]) -> Dict[str, Any]:
+        return {**meta, "id": meta.get("__id__"), "created_at": meta.get("__created_at__")}
+
+    def _rows_by_ids(self, ids: List[str], columns: str) -> Dict[str, tuple]:
+        found = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT id, {columns} FROM vectors WHERE id IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall()
+            found.update({row[0]: row[1:] for row in rows})
+        return found
+
+    async def get_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_by_ids([id]))[0]
+
+    async def get_by_ids(self, ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Lê primeiro as escritas pendentes (read-your-writes), depois o SQLite."""
+        stored = self._rows_by_ids([i for i in ids if i not in self._pending], "meta")
+        results = []
+        for doc_id in ids:
+            if doc_id in self._pending_deletes:
+                results.append(None)
+            elif doc_id in self._pending:
+                results.append(self._format(self._pending[doc_id]))
+            elif doc_id in stored:
+                results.append(self._format(json.loads(stored[doc_id][0])))
+            else:
+                results.append(None)
+        return results
+
+    async def get_vectors_by_ids(self, ids: List[str]) -> Dict[str, List[float]]:
+        pending = [i for i in ids if i in self._pending and i not in self._pending_deletes]
+        result = {}
+        if pending:
+            vectors = await self._embed([self._pending[i]["content"] for i in pending])
+            result.update({i: v.tolist() for i, v in zip(pending, vectors)})
+        stored = self._rows_by_ids([i for i in ids if i not in self._pending and i not in self._pending_deletes], "vector")
+        result.update({i: np.frombuffer(row[0], dtype=np.float32).tolist() for i, row in stored.items()})
+        return result
+
+    # ------------------------------------------------------------------ ciclo de vida
+
+    async def drop(self) -> Dict[str, str]:
+        try:
+            async with self._lock:
+                self._pending.clear()
+                self._pending_deletes.clear()
+                self._shards.clear()
+                self._conn.execute("DELETE FROM vectors")
+                self._conn.execute("DELETE FROM shards")
+                self._conn.commit()
+                self._reap_orphan_files()
+                self._load_shards()
+            return {"status": "success", "message": "data dropped"}
+        except Exception as e:
+            logger.error(f"[{self.workspace}] Erro ao limpar {self.namespace}: {e}")
+            return {"status": "error", "message": str(e)}
+
+    async def finalize(self):
+        await self.index_done_callback()
+        self._shards.clear()
+        self._conn.close()
@@ -0,0 +1,64 @@
+"""
+Migra os arquivos kv_store_*.json de um diretório do LightRAG para o SQLiteKVStorage.
+
+    python -m agents.plugins.storage.migrate database/rag_storage
+
+Percorre o diretório raiz e os subdiretórios de workspace. Os JSON originais
+são mantidos; o status dos documentos continua em JSON (JsonDocStatusStorage).
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+from agents.plugins.storage.sqlite_kv import DB_NAME, connect
+
+SKIP_NAMESPACES = {"doc_status"}
+
+
+def migrate_dir(directory: str) -> int:
+    files = sorted(glob.glob(os.path.join(directory, "kv_store_*.json")))
+    files = [f for f in files if os.path.basename(f)[len("kv_store_"):-len(".json")] not in SKIP_NAMESPACES]
+    if not files:
+        return 0
+
+    conn = connect(os.path.join(directory, DB_NAME))
+    total = 0
+    for path in files:
+        namespace = os.path.basename(path)[len("kv_store_"):-len(".json")]
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f) or {}
+
+        now = int(time.time())
+        rows = []
+        for key, value in data.items():
+            create_time = value.pop("create_time", now)
+            update_time = value.pop("update_time", now)
+            value.pop("_id", None)
+            rows.append((namespace, key, json.dumps(value, ensure_ascii=False), create_time, update_time))
+
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO kv (namespace, id, value, create_time, update_time) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+        total += len(rows)
+        print(f"{path}: {len(rows)} registros -> {namespace}")
+    conn.close()
+    return total
+
+
+def migrate(working_dir: str) -> int:
+    total = migrate_dir(working_dir)
+    for entry in sorted(os.scandir(working_dir), key=lambda e: e.name):
+        if entry.is_dir():
+            total += migrate_dir(entry.path)
+    return total
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migra kv_store_*.json para SQLite.")
+    parser.add_argument("working_dir", nargs="?", default="database/rag_storage")
+    args = parser.parse_args()
+    print(f"Total migrado: {migrate(args.working_dir)} registros")
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import re
+import time
+from typing import Any, Dict, List, Optional, Tuple, final
+
+from lightrag.kg.neo4j_impl import Neo4JStorage
+from lightrag.kg.shared_storage import get_data_init_lock
+from lightrag.utils import logger
+from neo4j import AsyncDriver, AsyncGraphDatabase, exceptions as neo4jExceptions
+
+# Linhas por UNWIND (uma transação cada) nas escritas em lote
+BATCH_SIZE = int(os.getenv("CARHELPER_NEO4J_BATCH_SIZE", "500"))
+# Consultas acima deste tempo (ms) são registradas no log
+SLOW_QUERY_MS = float(os.getenv("CARHELPER_NEO4J_SLOW_QUERY_MS", "200"))
+
+
+def _driver_options() -> Dict[str, Any]:
+    """Mesmas variáveis de ambiente e padrões do Neo4JStorage do LightRAG."""
+    return {
+        "max_connection_pool_size": int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "100")),
+        "connection_timeout": float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "30")),
+        "connection_acquisition_timeout": float(os.getenv("NEO4J_CONNECTION_ACQUISITION_TIMEOUT", "30")),
+        "max_transaction_retry_time": float(os.getenv("NEO4J_MAX_TRANSACTION_RETRY_TIME", "30")),
+        "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "300")),
+        "liveness_check_timeout": float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", "30")),
+        "keep_alive": os.getenv("NEO4J_KEEP_ALIVE", "true").lower() in ("true", "1", "yes", "on"),
+    }
+
+
+def _log_if_slow(query: str, started: float) -> None:
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    if elapsed_ms >= SLOW_QUERY_MS:
+        logger.warning(f"Cypher lenta ({elapsed_ms:.0f} ms): {' '.join(query.split())[:300]}")
+
+
+class _RecordingTransaction:
+    """Transação que guarda as consultas executadas, para o log de lentidão."""
+
+    def __init__(self, tx, queries: List[str]):
+        self._tx = tx
+        self._queries = queries
+
+    async def run(self, query, parameters=None, **kwargs):
+        self._queries.append(str(query))
+        return await self._tx.run(query, parameters, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._tx, name)
+
+
+class _TimedSession:
+    """Sessão do driver que mede run/execute_read/execute_write."""
+
+    def __init__(self, session):
+        self._session = session
+
+    async def __aenter__(self):
+        await self._session.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._session.__aexit__(*exc)
+
+    async def run(self, query, parameters=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await self._session.run(query, parameters, **kwargs)
+        finally:
+            _log_if_slow(str(query), started)
+
+    async def _timed(self, execute, work, args, kwargs):
+        queries: List[str] = []
+
+        async def recorded(tx, *a, **k):
+            return await work(_RecordingTransaction(tx, queries), *a, **k)
+
+        started = time.perf_counter()
+        try:
+            return await execute(recorded, *args, **kwargs)
+        finally:
+            _log_if_slow(" ; ".join(queries) or getattr(work, "__qualname__", "tx"), started)
+
+    async def execute_read(self, work, *args, **kwargs):
+        return await self._timed(self._session.execute_read, work, args, kwargs)
+
+    async def execute_write(self, work, *args, **kwargs):
+        return await self._timed(self._session.execute_write, work, args, kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+class _TimedDriver:
+    """Driver compartilhado cujas sessões registram consultas lentas."""
+
+    def __init__(self, driver: AsyncDriver):
+        self._driver = driver
+
+    def session(self, **kwargs) -> _TimedSession:
+        return _TimedSession(self._driver.session(**kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+
+# Um driver (pool de conexões) por servidor/usuário no processo: chave -> [driver, referências]
+_drivers: Dict[Tuple, list] = {}
+_drivers_lock = asyncio.Lock()
+
+
+async def acquire_driver(uri: str, username: str, password: str) -> _TimedDriver:
+    options = _driver_options()
+    key = (uri, username, password, tuple(sorted(options.items())))
+    async with _drivers_lock:
+        entry = _drivers.get(key)
+        if entry is None:
+            driver = AsyncGraphDatabase.driver(uri, auth=(username, password), **options)
+            entry = _drivers[key] = [_TimedDriver(driver), 0]
+            logger.info(f"Neo4j: novo pool para {uri} (até {options['max_connection_pool_size']} conexões)")
+        entry[1] += 1
+        return entry[0]
+
+
+async def release_driver(driver: _TimedDriver) -> None:
+    async with _drivers_lock:
+        for key, entry in list(_drivers.items()):
+            if entry[0] is driver:
+                entry[1] -= 1
+                if entry[1] <= 0:
+                    del _drivers[key]
+                    await driver.close()
+                return
+
+
+@final
+class PooledNeo4JStorage(Neo4JStorage):
+    """
+    Neo4JStorage com driver compartilhado.
+
+    - Todos os workspaces do processo usam o mesmo driver (pool) por servidor;
+      o driver é fechado quando o último storage é finalizado.
+    - As escritas em lote são as do LightRAG (upsert_nodes_batch e
+      upsert_edges_batch, com UNWIND), divididas em lotes de BATCH_SIZE para
+      limitar o tamanho de cada transação.
+    - Na inicialização, garante a constraint de unicidade (ou o índice) em
+      entity_id e o índice full-text do LightRAG.
+    - Consultas acima de CARHELPER_NEO4J_SLOW_QUERY_MS são registradas no log.
+    """
+
+    async def initialize(self):
+        async with get_data_init_lock():
+            if self._driver is not None:
+                return
+            uri = os.environ["NEO4J_URI"]
+            self._driver = await acquire_driver(
+                uri, os.getenv("NEO4J_USERNAME", ""), os.getenv("NEO4J_PASSWORD", "")
+            )
+            database = os.getenv("NEO4J_DATABASE", re.sub(r"[^a-zA-Z0-9-]", "-", self.namespace))
+            self._DATABASE = await self._resolve_database(database)
+            logger.info(f"[{self.workspace}] Connected to {self._DATABASE or 'default'} at {uri}")
+            await self._ensure_schema()
+
+    async def _resolve_database(self, database: str) -> Optional[str]:
+        """Usa (ou cria) o banco do namespace; sem suporte a vários bancos, o padrão."""
+        try:
+            async with self._driver.session(database=database) as session:
+                result = await session.run("MATCH (n) RETURN n LIMIT 0")
+                await result.consume()
+            return database
+        except neo4jExceptions.ClientError as e:
+            if e.code != "Neo.ClientError.Database.DatabaseNotFound":
+                raise
+        try:
+            async with self._driver.session() as session:
+                result = await session.run(f"CREATE DATABASE `{database}` IF NOT EXISTS")
+                await result.consume()
+            return database
+        except (neo4jExceptions.ClientError, neo4jExceptions.DatabaseError):
+            logger.warning(f"[{self.workspace}] Neo4j sem suporte a vários bancos; usando o banco padrão")
+            return None
+
+    async def _ensure_schema(self) -> None:
+        label = self._get_workspace_label()
+        async with self._driver.session(database=self._DATABASE) as session:
+            try:
+                result = await session.run(
+                    f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:`{label}`) REQUIRE n.entity_id IS UNIQUE"
+                )
+                await result.consume()
+            except neo4jExceptions.Neo4jError as e:
+                # Já existe um índice comum (criado pelo Neo4JStorage) ou há duplicatas
+                logger.info(f"[{self.workspace}] Constraint em entity_id indisponível ({e.code}); usando índice")
+                result = await session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:`{label}`) ON (n.entity_id)")
+                await result.consume()
+        await self._create_fulltext_index(self._driver, self._DATABASE, label)
+
+    async def finalize(self):
+        if self._driver is not None:
+            await release_driver(self._driver)
+            self._driver = None
+
+    async def upsert_nodes_batch(self, nodes: list[tuple[str, dict[str, str]]]) -> None:
+        for start in range(0, len(nodes), BATCH_SIZE):
+            await super().upsert_nodes_batch(nodes[start:start + BATCH_SIZE])
+
+    async def upsert_edges_batch(self, edges: list[tuple[str, str, dict[str, str]]]) -> None:
+        for start in range(0, len(edges), BATCH_SIZE):
+            await super().upsert_edges_batch(edges[start:start + BATCH_SIZE])
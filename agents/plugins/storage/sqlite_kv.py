@@ -0,0 +1,201 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, ClassVar, Dict, List, Optional, final
+
+from lightrag.base import BaseKVStorage
+from lightrag.exceptions import StorageNotInitializedError
+from lightrag.utils import logger
+
+DB_NAME = "kv_store.db"
+
+# Limite de parâmetros por statement no SQLite
+_CHUNK = 500
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS kv ("
+        " namespace TEXT NOT NULL,"
+        " id TEXT NOT NULL,"
+        " value TEXT NOT NULL,"
+        " create_time INTEGER NOT NULL,"
+        " update_time INTEGER NOT NULL,"
+        " PRIMARY KEY (namespace, id)) WITHOUT ROWID"
+    )
+    conn.commit()
+    return conn
+
+
+@final
+@dataclass
+class SQLiteKVStorage(BaseKVStorage):
+    """
+    Storage KV do LightRAG em SQLite (WAL), um arquivo por workspace.
+
+    Diferente do JsonKVStorage, nada é carregado inteiro na inicialização:
+    leituras são point lookups pela chave primária (namespace, id) e cada
+    upsert/delete é gravado em uma única transação. Leituras e escritas rodam
+    em threads (asyncio.to_thread), fora do event loop: um lookup que espera o
+    disco frio ou o lock do WAL não trava os outros turnos. Cada thread lê por
+    uma conexão própria, separada da de escrita, então leitores não esperam
+    escritas em andamento.
+    """
+
+    supports_strict_point_reads: ClassVar[bool] = True
+
+    def __post_init__(self):
+        working_dir = self.global_config["working_dir"]
+        workspace_dir = os.path.join(working_dir, self.workspace) if self.workspace else working_dir
+        os.makedirs(workspace_dir, exist_ok=True)
+        self._db_path = os.path.join(workspace_dir, DB_NAME)
+        self._writer: Optional[sqlite3.Connection] = None
+        self._write_lock = asyncio.Lock()
+        # Conexões de leitura, uma por thread do executor
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+
+    async def initialize(self):
+        if self._writer is None:
+            self._writer = connect(self._db_path)
+
+    async def finalize(self):
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+            self._local = threading.local()
+        for conn in readers:
+            conn.close()
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = None
+
+    def _reader(self) -> sqlite3.Connection:
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            if self._writer is None:
+                raise StorageNotInitializedError("SQLiteKVStorage")
+            conn = connect(self._db_path)
+            local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    async def index_done_callback(self) -> None:
+        # Cada escrita já é confirmada na própria transação
+        pass
+
+    @staticmethod
+    def _decode(id: str, value: str, create_time: int, update_time: int) -> Dict[str, Any]:
+        result = json.loads(value)
+        result["create_time"] = create_time
+        result["update_time"] = update_time
+        result["_id"] = id
+        return result
+
+    def _select(self, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        found = {}
+        for start in range(0, len(ids), _CHUNK):
+            chunk = ids[start:start + _CHUNK]
+            rows = self._reader().execute(
+                f"SELECT id, value, create_time, update_time FROM kv"
+                f" WHERE namespace = ? AND id IN ({','.join('?' * len(chunk))})",
+                [self.namespace, *chunk],
+            ).fetchall()
+            found.update({row[0]: self._decode(*row) for row in rows})
+        return found
+
+    async def get_by_id(self, id: str) -> Optional[Dict[str, Any]]:
+        return (await asyncio.to_thread(self._select, [id])).get(id)
+
+    async def get_by_id_strict(self, id: str) -> Optional[Dict[str, Any]]:
+        # Erros do SQLite propagam; None significa ausência confirmada
+        if self._writer is None:
+            raise StorageNotInitializedError("SQLiteKVStorage")
+        return await self.get_by_id(id)
+
+    async def get_by_ids(self, ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+        found = await asyncio.to_thread(self._select, list(dict.fromkeys(ids)))
+        return [found.get(id) for id in ids]
+
+    def _existing(self, keys: List[str]) -> set[str]:
+        existing = set()
+        for start in range(0, len(keys), _CHUNK):
+            chunk = keys[start:start + _CHUNK]
+            rows = self._reader().execute(
+                f"SELECT id FROM kv WHERE namespace = ? AND id IN ({','.join('?' * len(chunk))})",
+                [self.namespace, *chunk],
+            ).fetchall()
+            existing.update(row[0] for row in rows)
+        return existing
+
+    async def filter_keys(self, keys: set[str]) -> set[str]:
+        return set(keys) - await asyncio.to_thread(self._existing, list(keys))
+
+    def _write_batch(self, rows: List[tuple]) -> None:
+        with self._writer:
+            self._writer.executemany(
+                "INSERT INTO kv (namespace, id, value, create_time, update_time) VALUES (?, ?, ?, ?, ?)"
+                " ON CONFLICT (namespace, id) DO UPDATE SET value = excluded.value, update_time = excluded.update_time",
+                rows,
+            )
+
+    async def upsert(self, data: Dict[str, Dict[str, Any]]) -> None:
+        if not data:
+            return
+        now = int(time.time())
+        rows = []
+        for k, v in data.items():
+            # Mesmo contrato do JsonKVStorage
+            if self.namespace.endswith("text_chunks") and "llm_cache_list" not in v:
+                v["llm_cache_list"] = []
+            v["_id"] = k
+            value = {key: val for key, val in v.items() if key not in ("create_time", "update_time", "_id")}
+            rows.append((self.namespace, k, json.dumps(value, ensure_ascii=False), now, now))
+
+        logger.debug(f"[{self.workspace}] Inserting {len(rows)} records to {self.namespace}")
+        async with self._write_lock:
+            await asyncio.to_thread(self._write_batch, rows)
+
+    def _delete_batch(self, ids: List[str]) -> None:
+        with self._writer:
+            for start in range(0, len(ids), _CHUNK):
+                chunk = ids[start:start + _CHUNK]
+                self._writer.execute(
+                    f"DELETE FROM kv WHERE namespace = ? AND id IN ({','.join('?' * len(chunk))})",
+                    [self.namespace, *chunk],
+                )
+
+    async def delete(self, ids: List[str]) -> None:
+        if not ids:
+            return
+        async with self._write_lock:
+            await asyncio.to_thread(self._delete_batch, list(ids))
+
+    def _first_row(self) -> Optional[tuple]:
+        return self._reader().execute("SELECT 1 FROM kv WHERE namespace = ? LIMIT 1", (self.namespace,)).fetchone()
+
+    async def is_empty(self) -> bool:
+        return await asyncio.to_thread(self._first_row) is None
+
+    def _drop_namespace(self) -> None:
+        with self._writer:
+            self._writer.execute("DELETE FROM kv WHERE namespace = ?", (self.namespace,))
+
+    async def drop(self) -> Dict[str, str]:
+        try:
+            async with self._write_lock:
+                await asyncio.to_thread(self._drop_namespace)
+            logger.info(f"[{self.workspace}] Process {os.getpid()} drop {self.namespace}")
+            return {"status": "success", "message": "data dropped"}
+        except Exception as e:
+            logger.error(f"[{self.workspace}] Error dropping {self.namespace}: {e}")
+            return {"status": "error", "message": str(e)}
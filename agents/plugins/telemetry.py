@@ -0,0 +1,364 @@
+import functools
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+from google.adk.plugins.base_plugin import BasePlugin
+from opentelemetry import context as otel_context, trace
+
+from agents.tools.config import OTEL_EXPORTER, TELEMETRY_ENABLED
+
+ENABLED = TELEMETRY_ENABLED
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 10)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+INF = 'le="+Inf"'
+
+
+class Metrics:
+    """Contadores e histogramas em memória, exportados no formato texto do Prometheus."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: Dict[str, Dict[LabelKey, list]] = defaultdict(dict)
+        self._buckets: Dict[str, tuple] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str, buckets: Optional[tuple] = None) -> None:
+        self._help[name] = text
+        if buckets is not None:
+            self._buckets[name] = buckets
+
+    def inc(self, name: str, value: float = 1.0, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            self._counters[name][key] += value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        buckets = self._buckets.get(name, SECONDS_BUCKETS)
+        with self._lock:
+            # [contagem por bucket..., soma, total]
+            entry = self._histograms[name].setdefault(key, [0] * len(buckets) + [0.0, 0])
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    entry[i] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @staticmethod
+    def _escape(value: str) -> str:
+        # Escapes do formato texto do Prometheus para valores de label
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    @classmethod
+    def _labels(cls, key: LabelKey, extra: str = "") -> str:
+        parts = [f'{k}="{cls._escape(v)}"' for k, v in key]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{self._labels(k)} {v:g}" for k, v in sorted(series.items()))
+            for name, series in sorted(self._histograms.items()):
+                buckets = self._buckets.get(name, SECONDS_BUCKETS)
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, entry in sorted(series.items()):
+                    for bound, hits in zip(buckets, entry):
+                        le = 'le="%g"' % bound
+                        lines.append(f"{name}_bucket{self._labels(key, le)} {hits}")
+                    lines.append(f"{name}_bucket{self._labels(key, INF)} {entry[-1]}")
+                    lines.append(f"{name}_sum{self._labels(key)} {entry[-2]:g}")
+                    lines.append(f"{name}_count{self._labels(key)} {entry[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("carhelper_span_seconds", "Duração dos spans (agentes, tools, LightRAG).")
+metrics.describe("carhelper_span_errors_total", "Spans encerrados com exceção.")
+metrics.describe("carhelper_llm_calls_total", "Respostas completas de LLM por agente.")
+metrics.describe("carhelper_llm_tokens_total", "Tokens de LLM por agente e tipo (prompt/completion).")
+metrics.describe("carhelper_cache_requests_total", "Consultas aos caches por resultado.")
+metrics.describe("carhelper_quality_rounds", "Rodadas do loop de qualidade por turno.", COUNT_BUCKETS)
+metrics.describe("carhelper_quality_exit_total", "Motivo de saída do loop de qualidade.")
+metrics.describe("carhelper_route_total", "Rota do turno (pré-roteador, recepcionista, cache).")
+
+# Exportador dos spans: "none" usa o provider já configurado (no-op se nenhum),
+# "memory" guarda em memory_exporter, "console" imprime, "otlp" envia ao coletor
+memory_exporter = None
+
+
+def _setup_tracing() -> None:
+    global memory_exporter
+    if OTEL_EXPORTER == "none":
+        return
+
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+
+    if OTEL_EXPORTER == "memory":
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+        memory_exporter = InMemorySpanExporter()
+        processor = SimpleSpanProcessor(memory_exporter)
+    elif OTEL_EXPORTER == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+        processor = SimpleSpanProcessor(ConsoleSpanExporter())
+    elif OTEL_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        processor = BatchSpanProcessor(OTLPSpanExporter())
+    else:
+        raise ValueError(f"Exportador OpenTelemetry desconhecido: {OTEL_EXPORTER}")
+
+    provider = trace.get_tracer_provider()
+    if not hasattr(provider, "add_span_processor"):
+        provider = TracerProvider()
+        trace.set_tracer_provider(provider)
+    provider.add_span_processor(processor)
+
+
+if ENABLED:
+    _setup_tracing()
+
+_tracer = trace.get_tracer("carhelper")
+
+# Span do agente, tool ou trecho em execução nesta tarefa: pai dos spans abertos
+# dentro dele (inclusive nos agentes que o AgentTool roda e nas tarefas filhas)
+_current: ContextVar[Optional["Span"]] = ContextVar("carhelper_span", default=None)
+
+
+class Span:
+    """
+    Span do OpenTelemetry que também alimenta carhelper_span_seconds.
+    O pai é `parent` ou, sem ele, o span corrente. Serve como `with`/`async with`;
+    com attach=False não vira o span corrente ao entrar (o TelemetryPlugin
+    controla isso para spans abertos e fechados em callbacks diferentes).
+    """
+
+    __slots__ = ("name", "_attach", "_otel", "_token", "_current_token", "_started", "_totals")
+
+    def __init__(self, name: str, attach: bool = True, parent: Optional["Span"] = None, **attributes: Any):
+        self.name = name
+        self._attach = attach
+        self._token = None
+        self._current_token = None
+        self._totals: Dict[str, float] = {}
+        self._started = time.perf_counter()
+        parent = parent if parent is not None else _current.get()
+        self._otel = _tracer.start_span(
+            name,
+            context=trace.set_span_in_context(parent._otel) if parent is not None else None,
+            attributes={k: v for k, v in attributes.items() if v is not None},
+        )
+
+    def set(self, key: str, value: Any) -> None:
+        if value is not None:
+            self._otel.set_attribute(key, value)
+
+    def add(self, key: str, value: float) -> None:
+        """Soma `value` ao atributo numérico `key` (tokens de várias chamadas, por exemplo)."""
+        self._totals[key] = self._totals.get(key, 0) + value
+        self._otel.set_attribute(key, self._totals[key])
+
+    def __enter__(self) -> "Span":
+        if self._attach:
+            self._token = otel_context.attach(trace.set_span_in_context(self._otel))
+            self._current_token = _current.set(self)
+        return self
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        if error is not None:
+            self._otel.record_exception(error)
+            self._otel.set_status(trace.Status(trace.StatusCode.ERROR, str(error)))
+            metrics.inc("carhelper_span_errors_total", span=self.name)
+        self._otel.end()
+        metrics.observe("carhelper_span_seconds", time.perf_counter() - self._started, span=self.name)
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._token is not None:
+            otel_context.detach(self._token)
+            _current.reset(self._current_token)
+        self.end(exc)
+
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key: str, value: Any) -> None:
+        pass
+
+    def add(self, key: str, value: float) -> None:
+        pass
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str, attach: bool = True, **attributes: Any):
+    """Abre um span; desligada a telemetria, devolve um no-op compartilhado."""
+    if not ENABLED:
+        return NOOP_SPAN
+    return Span(name, attach=attach, **attributes)
+
+
+def current_span():
+    """Span em execução (agente, tool ou trecho); no-op se não houver."""
+    return (_current.get() if ENABLED else None) or NOOP_SPAN
+
+
+def count(name: str, value: float = 1.0, **labels: Any) -> None:
+    if ENABLED:
+        metrics.inc(name, value, **labels)
+
+
+def cache_result(cache: str, result: str) -> None:
+    """Conta a consulta a um cache e registra o resultado no span corrente (`cache.<nome>`)."""
+    if ENABLED:
+        metrics.inc("carhelper_cache_requests_total", cache=cache, result=result)
+        current_span().set(f"cache.{cache}", result)
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    if ENABLED:
+        metrics.observe(name, value, **labels)
+
+
+def traced(name: str):
+    """Decorador para corrotinas; sem telemetria, devolve a função original."""
+
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with Span(name):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class TelemetryPlugin(BasePlugin):
+    """
+    Plugin do ADK: um span por execução de agente e por chamada de tool,
+    e chamadas/tokens de LLM por agente. Vale também para os especialistas,
+    que o AgentTool roda com os plugins do Runner principal.
+
+    Cada span é filho do span do agente (ou da tool) que o invocou e fica
+    como span corrente até fechar; os tokens de LLM vão como atributos
+    (`llm.prompt_tokens`, `llm.completion_tokens`) no span do agente.
+    """
+
+    # Spans abertos além deste limite (agentes interrompidos por erro) são descartados
+    MAX_OPEN_SPANS = 1000
+
+    def __init__(self):
+        super().__init__(name="carhelper_telemetry")
+        # chave -> (span, token do span corrente, span pai)
+        self._open: Dict[tuple, tuple] = {}
+
+    def _start(self, key: tuple, name: str, **attributes: Any) -> None:
+        if len(self._open) >= self.MAX_OPEN_SPANS:
+            self._open.clear()
+        parent = _current.get()
+        opened = Span(name, attach=False, parent=parent, **attributes)
+        self._open[key] = (opened, _current.set(opened), parent)
+
+    def _finish(self, key: tuple, error: Optional[BaseException] = None) -> None:
+        entry = self._open.pop(key, None)
+        if entry is None:
+            return
+        opened, token, parent = entry
+        opened.end(error)
+        try:
+            _current.reset(token)
+        except (ValueError, RuntimeError):
+            # Fechado em outro contexto (tarefa diferente da que abriu o span)
+            _current.set(parent)
+
+    async def before_agent_callback(self, *, agent, callback_context):
+        self._start(
+            ("agent", callback_context.invocation_id, agent.name),
+            f"agent.{agent.name}",
+            agent=agent.name,
+            invocation_id=callback_context.invocation_id,
+        )
+        return None
+
+    async def after_agent_callback(self, *, agent, callback_context):
+        self._finish(("agent", callback_context.invocation_id, agent.name))
+        return None
+
+    async def after_model_callback(self, *, callback_context, llm_response):
+        usage = llm_response.usage_metadata
+        if llm_response.partial or usage is None:
+            return None
+        agent = callback_context.agent_name
+        prompt, completion = usage.prompt_token_count or 0, usage.candidates_token_count or 0
+        metrics.inc("carhelper_llm_calls_total", agent=agent)
+        metrics.inc("carhelper_llm_tokens_total", prompt, agent=agent, kind="prompt")
+        metrics.inc("carhelper_llm_tokens_total", completion, agent=agent, kind="completion")
+        active = current_span()
+        active.add("llm.calls", 1)
+        active.add("llm.prompt_tokens", prompt)
+        active.add("llm.completion_tokens", completion)
+        return None
+
+    async def before_tool_callback(self, *, tool, tool_args, tool_context):
+        self._start(
+            ("tool", tool_context.invocation_id, tool_context.function_call_id),
+            f"tool.{tool.name}",
+            tool=tool.name,
+            agent=tool_context.agent_name,
+        )
+        return None
+
+    async def after_tool_callback(self, *, tool, tool_args, tool_context, result):
+        self._finish(("tool", tool_context.invocation_id, tool_context.function_call_id))
+        return None
+
+    async def on_tool_error_callback(self, *, tool, tool_args, tool_context, error):
+        self._finish(("tool", tool_context.invocation_id, tool_context.function_call_id), error)
+        return None
+
+
+def render_metrics() -> str:
+    return metrics.render()
@@ -0,0 +1,90 @@
+"""
+Aquecimento do processo do servidor: engines LightRAG (índices abertos),
+grafo de agentes carregado pelo ADK, modelo de embeddings e cache de respostas.
+O estado alimenta os endpoints /livez e /readyz.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from agents.plugins.answer_cache import get_answer_cache
+from agents.tools.config import KV_STORAGE, VECTOR_STORAGE, WARMUP_RETRY_SECONDS, configure_embedding
+from agents.tools.toolset import sync_manuals, warm_engines
+
+# Storages cujo conteúdo é lido do disco sob demanda (mmap/SQLite): vários
+# workers compartilham o page cache do SO em vez de uma cópia por processo
+SHARED_STORAGES = {"SQLiteKVStorage", "ShardedFaissVectorDBStorage"}
+
+
+@dataclass
+class WarmupState:
+    ready: bool = False
+    started_at: float = field(default_factory=time.monotonic)
+    seconds: Optional[float] = None
+    attempts: int = 0
+    error: Optional[str] = None
+    steps: Dict[str, float] = field(default_factory=dict)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "pid": os.getpid(),
+            "warmup_seconds": self.seconds,
+            "attempts": self.attempts,
+            "steps": self.steps,
+            "error": self.error,
+        }
+
+
+state = WarmupState()
+
+
+def unshared_storages() -> List[str]:
+    """Storages configurados que carregam uma cópia inteira em cada worker."""
+    return [name for name in (KV_STORAGE, VECTOR_STORAGE) if name not in SHARED_STORAGES]
+
+
+async def _step(name: str, coro) -> None:
+    started = time.perf_counter()
+    await coro
+    state.steps[name] = round(time.perf_counter() - started, 3)
+
+
+async def _load_agent(agent_loader, name: str) -> None:
+    # Importar os módulos dos agentes é síncrono e leva alguns segundos
+    await asyncio.to_thread(agent_loader.load_agent, name)
+
+
+async def warm_up(agent_loader=None, agents: tuple = ("master",), index: bool = False) -> bool:
+    """
+    Prepara o processo antes de aceitar tráfego. Com `index=True` também
+    sincroniza os manuais (só um processo deve fazer isso). Devolve se ficou pronto.
+    """
+    state.attempts += 1
+    try:
+        await _step("engines", warm_engines())
+        if index:
+            await _step("index", sync_manuals())
+        if agent_loader is not None:
+            for name in agents:
+                await _step(f"agent:{name}", _load_agent(agent_loader, name))
+        # Modelo local carregado / consulta em cache: o primeiro usuário não paga a subida
+        await _step("embeddings", configure_embedding().func(["aquecimento"]))
+        await asyncio.to_thread(get_answer_cache)
+    except Exception as exc:
+        state.error = f"{type(exc).__name__}: {exc}"
+        print(f"Aviso: aquecimento incompleto (tentativa {state.attempts}): {state.error}")
+        return False
+
+    state.ready, state.error = True, None
+    state.seconds = round(time.monotonic() - state.started_at, 3)
+    return True
+
+
+async def retry_until_ready(agent_loader=None, index: bool = False) -> None:
+    """Tarefa de fundo: repete o aquecimento até o processo ficar pronto."""
+    while not state.ready:
+        await asyncio.sleep(WARMUP_RETRY_SECONDS)
+        await warm_up(agent_loader, index=index)
@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+from agents.plugins.answer_cache import normalize_query
+
+EmbedFunc = Callable[[List[str]], Awaitable[np.ndarray]]
+
+GREETING_REPLY = (
+    "Olá! Sou o assistente de dúvidas sobre o Ford KA e o Fiat Mobi. "
+    "Posso ajudar com informações técnicas, comparações, manutenção e uso dos dois carros. "
+    "Qual é a sua pergunta?"
+)
+THANKS_REPLY = (
+    "Por nada! Se surgir outra dúvida sobre o Ford KA ou o Fiat Mobi, é só perguntar."
+)
+OUT_OF_SCOPE_REPLY = (
+    "Desculpe, este sistema é focado em dúvidas sobre o Ford KA e o Fiat Mobi. "
+    "Pergunte algo sobre especificações, manutenção ou uso desses carros."
+)
+
+# Léxico (já normalizado: minúsculas e sem acentos)
+GREETINGS = re.compile(
+    r"^(?:(?:oi+|ola|opa|eai|e ai|hey|hello|salve|bom dia|boa tarde|boa noite|"
+    r"tudo bem|tudo bom|como vai|beleza)\s*)+$"
+)
+THANKS = re.compile(
+    r"^(?:(?:muito |mt )?(?:obrigad[oa]s?|valeu|vlw|agradec\w*|tchau|ate mais|ate logo|"
+    r"pela ajuda|por tudo|era isso|so isso)\s*)+$"
+)
+# Só o nome do modelo conta; a marca sozinha ("ford ranger", "fiat uno") é ambígua
+FORD_KA = re.compile(r"\b(?:ford ?ka|ka)\b")
+FIAT_MOBI = re.compile(r"\b(?:fiat ?mobi|mobi)\b")
+BRANDS = re.compile(r"\b(?:ford|fiat)\b")
+COMPARISON = re.compile(r"\b(?:compar\w*|diferenc\w*|versus|vs|ambos|os dois)\b")
+CAR_TERMS = re.compile(
+    r"\b(?:carro|veiculo|motor|oleo|pneu\w*|calibr\w*|freio\w*|revis\w*|manutenc\w*|bateria|"
+    r"embreagem|cambio|marcha\w*|farol|farois|lampada\w*|painel|luz|luzes|combustivel|gasolina|"
+    r"etanol|alcool|flex|consumo|tanque|filtro\w*|correia|vela\w*|radiador|arrefec\w*|"
+    r"airbag\w*|cinto\w*|porta\w*|vidro\w*|retrovisor\w*|limpador\w*|ar condicionado|direcao|"
+    r"suspensao|estepe|macaco|fusivel\w*|chave|alarme|garantia|quilometr\w*|km|rodas?|"
+    r"velocidade|potencia|torque|porta malas|bagageiro|manual|chassi)\b"
+)
+OUT_OF_SCOPE_TERMS = re.compile(
+    r"\b(?:receita|futebol|politic\w*|eleic\w*|filme\w*|musica\w*|piada\w*|"
+    r"bitcoin|bolsa de valores|horoscopo|namor\w*|dieta|academia|programacao|"
+    r"python|javascript|capital d[aeo]|presidente)\b"
+)
+
+# Frases-protótipo para o classificador opcional por embeddings
+PROTOTYPES: Dict[str, List[str]] = {
+    "greeting": ["oi tudo bem", "bom dia", "ola como vai"],
+    "thanks": ["obrigado pela ajuda", "valeu", "muito obrigada tchau"],
+    "out_of_scope": [
+        "qual a capital da franca",
+        "me conta uma piada",
+        "quem ganhou o jogo de futebol",
+        "receita de bolo de chocolate",
+    ],
+    "especialista_fordka": [
+        "qual o oleo do ford ka",
+        "como trocar o pneu do ka",
+        "intervalo de revisao do ford ka",
+    ],
+    "especialista_fiatmobi": [
+        "qual o oleo do fiat mobi",
+        "como trocar o pneu do mobi",
+        "intervalo de revisao do fiat mobi",
+    ],
+    "especialista_generalista": [
+        "qual a diferenca entre o ka e o mobi",
+        "qual carro consome menos",
+        "como calibrar os pneus do carro",
+    ],
+}
+
+
+@dataclass
+class Route:
+    """
+    Decisão do pré-roteador.
+
+    - kind: "greeting", "thanks", "out_of_scope", "specialist" ou "llm" (fica com o recepcionista)
+    - specialist: nome da tool do especialista quando kind == "specialist"
+    """
+
+    kind: str
+    confidence: float
+    specialist: Optional[str] = None
+    reply: Optional[str] = None
+
+
+class PreRouter:
+    """
+    Classificador local que roda antes do ReceptionistAgent.
+
+    Cumprimentos, agradecimentos e mensagens claramente fora do escopo são
+    respondidos direto; perguntas técnicas com o modelo do carro (ou comparação)
+    vão direto ao especialista. Mensagens que só citam o modelo ("e do Mobi?")
+    dependem da conversa e ficam abaixo de `min_confidence`, com o recepcionista (LLM).
+    Com `embed`, mensagens sem decisão pelo léxico são comparadas às frases
+    de PROTOTYPES antes de cair no LLM.
+    """
+
+    def __init__(
+        self,
+        min_confidence: float = 0.75,
+        embed: Optional[EmbedFunc] = None,
+        embed_threshold: float = 0.8,
+    ):
+        self.min_confidence = min_confidence
+        self.embed = embed
+        self.embed_threshold = embed_threshold
+        self._prototypes: Optional[tuple[List[str], np.ndarray]] = None
+
+    def classify(self, text: str) -> Route:
+        """Classificação só pelo léxico."""
+        text = normalize_query(text)
+        if not text:
+            return Route("llm", 0.0)
+
+        if GREETINGS.match(text):
+            return Route("greeting", 1.0, reply=GREETING_REPLY)
+        if THANKS.match(text):
+            return Route("thanks", 1.0, reply=THANKS_REPLY)
+
+        ka = bool(FORD_KA.search(text))
+        mobi = bool(FIAT_MOBI.search(text))
+        car_terms = len(CAR_TERMS.findall(text))
+        comparison = bool(COMPARISON.search(text))
+
+        # Sem termo técnico nem comparação, a mensagem só nomeia o modelo: abaixo do limiar
+        if ka and mobi:
+            return Route("specialist", 0.95 if car_terms or comparison else 0.6, specialist="especialista_generalista")
+        if ka or mobi:
+            if comparison:
+                return Route("specialist", 0.8, specialist="especialista_generalista")
+            specialist = "especialista_fordka" if ka else "especialista_fiatmobi"
+            return Route("specialist", 0.9 if car_terms else 0.5, specialist=specialist)
+
+        if BRANDS.search(text):
+            # Marca sem o modelo (outro carro da Ford/Fiat?): o recepcionista decide
+            return Route("llm", 0.0)
+
+        if car_terms:
+            # Pergunta técnica sem modelo: generalista, com confiança pelo nº de termos
+            confidence = 0.8 if car_terms >= 2 else 0.6
+            return Route("specialist", confidence, specialist="especialista_generalista")
+
+        if OUT_OF_SCOPE_TERMS.search(text):
+            return Route("out_of_scope", 0.85, reply=OUT_OF_SCOPE_REPLY)
+
+        return Route("llm", 0.0)
+
+    async def _classify_embedding(self, text: str) -> Optional[Route]:
+        if self._prototypes is None:
+            labels = [label for label, phrases in PROTOTYPES.items() for _ in phrases]
+            phrases = [p for ps in PROTOTYPES.values() for p in ps]
+            self._prototypes = (labels, _normalize(await self.embed(phrases)))
+
+        labels, matrix = self._prototypes
+        similarities = matrix @ _normalize(await self.embed([normalize_query(text)]))[0]
+        best = int(np.argmax(similarities))
+        confidence = float(similarities[best])
+        if confidence < self.embed_threshold:
+            return None
+
+        label = labels[best]
+        if label == "greeting":
+            return Route("greeting", confidence, reply=GREETING_REPLY)
+        if label == "thanks":
+            return Route("thanks", confidence, reply=THANKS_REPLY)
+        if label == "out_of_scope":
+            return Route("out_of_scope", confidence, reply=OUT_OF_SCOPE_REPLY)
+        return Route("specialist", confidence, specialist=label)
+
+    async def route(self, text: str) -> Route:
+        route = self.classify(text)
+        if route.confidence >= self.min_confidence:
+            return route
+
+        if self.embed is not None:
+            embedded = await self._classify_embedding(text)
+            if embedded is not None:
+                return embedded
+
+        return Route("llm", route.confidence)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+import re
+
+# Sinais de vazamento no rascunho: chaves, variáveis de ambiente e trechos de instruções internas
+LEAK_PATTERNS = [
+    re.compile(r"\bsk-[A-Za-z0-9_-]{16,}"),
+    re.compile(r"\b(?:OPENAI_API_KEY|NEO4J_(?:PASSWORD|USERNAME|URI))\b"),
+    re.compile(r"\b(?:mark_flow_done|mark_quality_done|busca_documentos)\b"),
+    re.compile(r"REGRA [ABC]\s*[—-]"),
+    re.compile(r"\{resposta_(?:consultor|rascunho)\}"),
+]
+
+
+def is_blocked(verdict: str) -> bool:
+    return "BLOQUEADO" in verdict
+
+
+def check_draft(draft: str) -> str:
+    """
+    Verificação local do rascunho, no mesmo formato do SecurityAgent.
+    Usada quando a pergunta já passou pela triagem (QuestionSecurityAgent).
+    """
+    for pattern in LEAK_PATTERNS:
+        if pattern.search(draft):
+            return "STATUS: BLOQUEADO\nMOTIVO: O rascunho expõe dados ou instruções internas."
+    return "STATUS: SEGURO\nMOTIVO: Pergunta aprovada na triagem e rascunho sem vazamentos."
@@ -17,7 +17,7 @@ class SpecialistAgent(LlmAgent):
                 "1) Analise a pergunta do usuário e identifique as principais pontos da dúvida ou solicitação\n"
                 "2) Sempre realize buscas nas ferramentas disponibilizadas para encontrar informações relevantes, mesmo que a pergunta pareça simples ou direta. Nunca responda com base em conhecimento prévio ou suposições.\n" \
                 "3) Leia atentamente os documentos recuperados e seleciona os trechos mais relevantes para responder à pergunta do usuário. **NÃO ADICIONE CONHECIMENTO PRÉVIO**\n"
+                "4) Os trechos recuperados indicam a origem no formato 'arquivo.pdf#page=N'. Sempre que possível, cite a página do manual usada na resposta (ex.: 'manual do Ford KA, p. 42').\n"
             ),
             tools=[ManualToolset()],
-            output_key="resposta_consultor",
         )
@@ -10,7 +10,7 @@ class FinalAgent(LlmAgent):
             model=configure_model(),
             description="Entrega a resposta final ao usuário com tom amigável.",
             instruction=(
-                "Retorne ao usuário apenas o texto final pronto, com base em: {resposta_rascunho}\n"
+                "Retorne ao usuário apenas o texto final pronto, com base em: {temp:resposta_rascunho}\n"
                 "Escreva em tom amigável e acolhedor, em português do Brasil.\n"
                 "Não inclua logs, notas internas ou campos estruturados."
             ),
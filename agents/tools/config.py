@@ -1,6 +1,149 @@
+import os
+
 from google.adk.models.lite_llm import LiteLlm
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FORD_KA_PDF = os.path.join(BASE_DIR, "database", "documents", "manual-fordka.pdf")
+MOBI_PDF = os.path.join(BASE_DIR, "database", "documents", "manual-mobi.pdf")
+RAG_STORAGE_DIR = os.path.join(BASE_DIR, "database", "rag_storage")
+CACHE_DIR = os.path.join(BASE_DIR, "database", "cache")
+
+# Storages do LightRAG. "ShardedFaissVectorDBStorage" grava o índice em shards
+# append-only abertos via mmap (compartilhados entre workers)
+# "SQLiteKVStorage" troca os kv_store_*.json por um SQLite indexado por workspace
+# "PooledNeo4JStorage" compartilha o driver do Neo4j entre os workspaces;
+# "NetworkXStorage" dispensa o servidor (grafo em arquivo, útil para testes)
+KV_STORAGE = os.getenv("CARHELPER_KV_STORAGE", "JsonKVStorage")
+GRAPH_STORAGE = os.getenv("CARHELPER_GRAPH_STORAGE", "Neo4JStorage")
+VECTOR_STORAGE = os.getenv("CARHELPER_VECTOR_STORAGE", "FaissVectorDBStorage")
+VECTOR_INDEX_OPTIONS = {
+    # "flat" (busca exata), "hnsw" ou "ivf" para bases maiores
+    "index_type": os.getenv("CARHELPER_VECTOR_INDEX", "flat"),
+    "ef_search": int(os.getenv("CARHELPER_HNSW_EF_SEARCH", "64")),
+    "nprobe": int(os.getenv("CARHELPER_IVF_NPROBE", "16")),
+    "max_shards": int(os.getenv("CARHELPER_VECTOR_MAX_SHARDS", "16")),
+}
+
+# Cada manual tem seu próprio workspace no LightRAG (índice vetorial e grafo isolados)
+# "aliases" são os nomes do carro removidos das consultas dos outros manuais
+MANUALS = {
+    "fordka": {"label": "Ford KA", "path": FORD_KA_PDF, "aliases": ["ford ka", "ka", "ford"]},
+    "mobi": {"label": "Fiat Mobi", "path": MOBI_PDF, "aliases": ["fiat mobi", "mobi", "fiat"]},
+}
+
+# Manuais (workspaces) consultados por cada especialista
+SPECIALIST_MANUALS = {
+    "especialista_fordka": ["fordka"],
+    "especialista_fiatmobi": ["mobi"],
+    "especialista_generalista": [
+        "fordka",
+        "mobi"
+    ]
+}
+
+# Especialistas recebem só o contexto recuperado (sem resposta gerada pelo LightRAG)
+RETRIEVAL_ONLY_CONTEXT = os.getenv("CARHELPER_RETRIEVAL_ONLY_CONTEXT", "0") == "1"
+
+# Especialistas com mais de um manual: uma consulta por manual, em paralelo,
+# com top_k menor e tempo limite por manual (segundos)
+FANOUT_TOP_K = int(os.getenv("CARHELPER_FANOUT_TOP_K", "3"))
+MANUAL_QUERY_TIMEOUT = float(os.getenv("CARHELPER_MANUAL_QUERY_TIMEOUT", "20"))
+
+# Cache semântico de respostas finais
+ANSWER_CACHE_DB = os.path.join(CACHE_DIR, "answers.db")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("CARHELPER_ANSWER_CACHE_THRESHOLD", "0.93"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("CARHELPER_ANSWER_CACHE_TTL", str(7 * 24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("CARHELPER_ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+# Pré-roteador local antes do recepcionista (cumprimentos, fora do escopo e
+# perguntas claras vão direto, sem chamada ao LLM)
+ROUTER_ENABLED = os.getenv("CARHELPER_ROUTER", "1") == "1"
+ROUTER_MIN_CONFIDENCE = float(os.getenv("CARHELPER_ROUTER_MIN_CONFIDENCE", "0.75"))
+# Usa também o modelo de embeddings configurado para mensagens sem decisão pelo léxico
+ROUTER_EMBEDDINGS = os.getenv("CARHELPER_ROUTER_EMBEDDINGS", "0") == "1"
+# Perguntas anteriores do usuário enviadas junto quando o especialista é chamado direto
+ROUTER_HISTORY_QUESTIONS = int(os.getenv("CARHELPER_ROUTER_HISTORY", "2"))
+
+# Triagem de segurança da pergunta em paralelo com roteamento e busca; a revisão
+# pós-resposta passa a ser só uma verificação local do rascunho
+SPECULATIVE_SECURITY = os.getenv("CARHELPER_SPECULATIVE_SECURITY", "0") == "1"
+
+# Spans (OpenTelemetry) e métricas do /metrics; desligado, a instrumentação é no-op
+# Exportador dos spans: "none", "memory", "console" ou "otlp" (OTEL_EXPORTER_OTLP_*)
+TELEMETRY_ENABLED = os.getenv("CARHELPER_TELEMETRY", "0") == "1"
+OTEL_EXPORTER = os.getenv("CARHELPER_OTEL_EXPORTER", "none")
+
+# Sessões do ADK (histórico dos diálogos). Com CARHELPER_SESSION_BATCHED=1 os eventos
+# de um turno são gravados numa transação só, no fim do turno
+SESSION_DB_URL = os.getenv("CARHELPER_SESSION_DB_URL", "sqlite+aiosqlite:///database/dialog/dialog.db")
+SESSION_BATCHED = os.getenv("CARHELPER_SESSION_BATCHED", "1") == "1"
+SESSION_POOL_SIZE = int(os.getenv("CARHELPER_SESSION_POOL_SIZE", "5"))
+SESSION_BUSY_TIMEOUT_MS = int(os.getenv("CARHELPER_SESSION_BUSY_TIMEOUT_MS", "5000"))
+# Sessões sem atividade há mais que o TTL são apagadas pela compactação periódica
+SESSION_TTL_SECONDS = int(os.getenv("CARHELPER_SESSION_TTL", str(30 * 24 * 3600)))
+SESSION_COMPACT_INTERVAL = int(os.getenv("CARHELPER_SESSION_COMPACT_INTERVAL", "3600"))
+
+# Modo produção (python main.py --prod): workers do uvicorn e intervalo entre
+# tentativas de aquecimento quando a subida falha
+SERVER_WORKERS = int(os.getenv("CARHELPER_WORKERS", str(os.cpu_count() or 1)))
+WARMUP_RETRY_SECONDS = float(os.getenv("CARHELPER_WARMUP_RETRY_SECONDS", "30"))
+
+# Backend de embeddings: "openai" (API) ou "sentence-transformers" (local, CPU)
+EMBEDDING_BACKEND = os.getenv("CARHELPER_EMBEDDING_BACKEND", "openai")
+EMBEDDING_MODEL = os.getenv(
+    "CARHELPER_EMBEDDING_MODEL",
+    "text-embedding-3-small" if EMBEDDING_BACKEND == "openai" else "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+)
+EMBEDDING_DEVICE = os.getenv("CARHELPER_EMBEDDING_DEVICE", "cpu")
+EMBEDDING_BATCH_SIZE = int(os.getenv("CARHELPER_EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_CACHE_DB = os.path.join(CACHE_DIR, "embeddings.db")
+# Sem acesso à rede: o modelo local precisa estar no cache do HF ou em um caminho local
+OFFLINE = os.getenv("CARHELPER_OFFLINE", "0") == "1"
+
+_embedding = None
+
+
+def configure_embedding():
+    """
+    EmbeddingFunc do LightRAG para o backend configurado, com cache em disco.
+    A mesma instância é usada pelo LightRAG e pelo cache de respostas.
+    """
+    global _embedding
+    if _embedding is None:
+        from lightrag.utils import EmbeddingFunc
+        from agents.plugins.embedding import (
+            CachedEmbedder,
+            EmbeddingStore,
+            OpenAIEmbeddingBackend,
+            SentenceTransformerBackend,
+        )
+
+        if EMBEDDING_BACKEND == "sentence-transformers":
+            backend = SentenceTransformerBackend(
+                EMBEDDING_MODEL,
+                device=EMBEDDING_DEVICE,
+                batch_size=EMBEDDING_BATCH_SIZE,
+                offline=OFFLINE,
+            )
+        elif EMBEDDING_BACKEND == "openai":
+            backend = OpenAIEmbeddingBackend(EMBEDDING_MODEL)
+        else:
+            raise ValueError(f"Backend de embedding desconhecido: {EMBEDDING_BACKEND}")
+
+        embedder = CachedEmbedder(backend, EmbeddingStore(EMBEDDING_CACHE_DB))
+        _embedding = EmbeddingFunc(embedding_dim=backend.dim, max_token_size=8192, func=embedder)
+    return _embedding
+
+
+def embedding_signature() -> tuple:
+    """(modelo, dimensão) dos embeddings configurados; o modelo inclui o backend ("openai/...", "st/...")."""
+    embedding = configure_embedding()
+    return embedding.func.backend.name, embedding.embedding_dim
+
+
 def configure_model():
     MODEL_NAME = "openai/gpt-4o-mini"
     MODEL = LiteLlm(model=MODEL_NAME)
-    return MODEL
\ No newline at end of file
+    return MODEL
@@ -4,6 +4,6 @@ from google.adk.tools.tool_context import ToolContext
 
 def mark_quality_done(tool_context: ToolContext) -> dict:
     """Encerra o loop de qualidade."""
-    tool_context.state["quality_done"] = True
+    tool_context.state["temp:quality_done"] = True
     tool_context.actions.skip_summarization = True
     return {}
\ No newline at end of file
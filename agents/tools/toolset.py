@@ -1,4 +1,7 @@
+import asyncio
+import logging
 import os
+import re
 from typing import List
 from google.adk.tools.base_toolset import BaseToolset
 from google.adk.tools.function_tool import FunctionTool
@@ -6,13 +9,131 @@ from google.adk.tools.base_tool import BaseTool
 from google.adk.agents.readonly_context import ReadonlyContext
 
 from agents.plugins.retrieve import run_async_query
-from agents.plugins.ingestion import initialize_rag, index_file
+from agents.plugins.ingestion import index_file
+from agents.plugins.engine import get_rag
+from agents.plugins.manifest import read_manifest, workspace_dir
+from agents.plugins.progress import report
+from agents.tools.config import (
+    FANOUT_TOP_K,
+    MANUAL_QUERY_TIMEOUT,
+    MANUALS,
+    RAG_STORAGE_DIR,
+    RETRIEVAL_ONLY_CONTEXT,
+    SPECIALIST_MANUALS,
+)
 
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+logger = logging.getLogger(__name__)
+
+
+async def warm_engines() -> None:
+    """Inicializa o engine de cada workspace de manual."""
+    for manual in MANUALS:
+        await get_rag(RAG_STORAGE_DIR, workspace=manual)
+
+
+async def sync_manuals(force: bool = False) -> int:
+    """Indexa, cada um no seu workspace, os manuais que mudaram desde a última indexação."""
+    count = 0
+    for manual, spec in MANUALS.items():
+        # Verifica se o arquivo realmente existe antes de tentar indexar (boa prática)
+        if not os.path.exists(spec["path"]):
+            print(f"ERRO: Arquivo não encontrado -> {spec['path']}")
+            continue
+        rag = await get_rag(RAG_STORAGE_DIR, workspace=manual)
+        count += await index_file(rag, spec["path"], force=force)
+    return count
+
+
+def manual_hash(manual: str) -> str:
+    """
+    Hash do PDF indexado no workspace do manual, com o modelo e a dimensão dos
+    embeddings da indexação ('-' se ainda não indexado).
+    """
+    manifest = read_manifest(workspace_dir(RAG_STORAGE_DIR, manual))
+    entry = manifest.get(MANUALS[manual]["path"])
+    return f"{entry.sha256}@{entry.embedding_model}/{entry.embedding_dim}" if entry else "-"
+
+
+def manual_version(specialist: str) -> str:
+    """
+    Versão dos manuais de um especialista, derivada dos hashes e dos modelos de
+    embeddings do manifesto. Muda sempre que algum desses manuais é reindexado.
+    """
+    return "|".join(f"{m}:{manual_hash(m)}" for m in SPECIALIST_MANUALS.get(specialist, []))
+
+
+async def search_manual(manual: str, query: str, top_k: int = 5) -> str:
+    """Consulta apenas o workspace de um manual."""
+    rag = await get_rag(RAG_STORAGE_DIR, workspace=manual)
+    return await run_async_query(
+        rag,
+        query,
+        "mix",
+        top_k=top_k,
+        only_need_context=RETRIEVAL_ONLY_CONTEXT,
+        manuals=[f"{manual}:{manual_hash(manual)}"],
+    )
+
+
+_VEHICLE = r"(?:\b(?:d|n)?[oa]\s+)?\b(?:" + "|".join(
+    re.escape(alias)
+    for alias in sorted((a for spec in MANUALS.values() for a in spec["aliases"]), key=len, reverse=True)
+) + r")\b"
+# Um ou mais carros ligados por conectivos: "entre o Ka e o Mobi", "Ka vs Mobi", "do mobi e do ka"
+_VEHICLES = re.compile(
+    rf"(?:\bentre\s+)?{_VEHICLE}(?:\s*(?:,|\bou\b|\be\b|\bvs\b\.?|\bversus\b|\bx\b)\s*{_VEHICLE})*",
+    re.IGNORECASE,
+)
+# Conectivos que sobram sem o carro no fim de uma frase: "tem airbag? e o Mobi?" -> "tem airbag? e?"
+_DANGLING = re.compile(r"(?:\s*\b(?:e|ou|com|vs|versus|x)\b\.?)+\s*(?=[?!.]|$)", re.IGNORECASE)
+# Abaixo disso a pergunta sem os carros perdeu o sentido ("compare o Ka com o Mobi" -> "compare")
+_MIN_CONTENT_WORDS = 2
+_FUNCTION_WORDS = {"qual", "quais", "que", "como", "entre", "dos", "das", "nos", "nas", "pelo", "pela", "para", "com"}
+
+
+def _content_words(text: str) -> int:
+    return sum(1 for w in re.findall(r"\w+", text.lower()) if len(w) > 2 and w not in _FUNCTION_WORDS)
+
+
+def query_for_manual(query: str, manual: str) -> str:
+    """
+    Decompõe uma pergunta comparativa para um único manual: remove os nomes
+    dos carros (com artigos e conectivos) e prefixa o modelo do manual.
+    Ex.: "qual consome menos, Ka ou Mobi?" -> "Ford KA: qual consome menos?"
+    Se sobrarem menos de _MIN_CONTENT_WORDS palavras de conteúdo, usa a pergunta original.
+    """
+    text = _VEHICLES.sub(" ", query)
+    text = _DANGLING.sub("", re.sub(r"\s+", " ", text))
+    text = re.sub(r"\s*[,;:]?\s*([?!.])", r"\1", text)
+    text = re.sub(r"([?!.])[?!.\s]*[?!.]", r"\1", text).strip(" ,;:")
+    if _content_words(text) < _MIN_CONTENT_WORDS:
+        text = query
+    return f"{MANUALS[manual]['label']}: {text}"
+
+
+async def fan_out(manuais: List[str], query: str) -> str:
+    """
+    Uma consulta por manual, em paralelo, cada uma com tempo limite próprio.
+    O resultado é um contexto lado a lado, uma seção por carro.
+    """
+
+    async def branch(manual: str) -> str:
+        sub_query = query_for_manual(query, manual)
+        try:
+            result = await asyncio.wait_for(
+                search_manual(manual, sub_query, top_k=FANOUT_TOP_K), MANUAL_QUERY_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            result = "Sem resultado: a consulta a este manual excedeu o tempo limite."
+        except Exception as e:
+            # Falha em um manual não derruba os outros: a seção dele fica sem resultado
+            logger.warning("Falha na consulta ao manual %s: %s", manual, e)
+            result = "Sem resultado: a consulta a este manual falhou."
+        return f"## {MANUALS[manual]['label']}\nConsulta: {sub_query}\n\n{result}"
+
+    partes = await asyncio.gather(*(branch(m) for m in manuais))
+    return "\n\n".join(partes)
 
-FORD_KA_PDF = os.path.join(BASE_DIR, "database", "documents", "manual-fordka.pdf")
-MOBI_PDF = os.path.join(BASE_DIR, "database", "documents", "manual-mobi.pdf")
-RAG_STORAGE_DIR = os.path.join(BASE_DIR, "database", "rag_storage")
 
 class ManualToolset(BaseToolset):
     async def get_tools(self, readonly_context: ReadonlyContext) -> List[BaseTool]:
@@ -20,35 +141,23 @@ class ManualToolset(BaseToolset):
         # Identificar agente está executando no momento
         agent_name = readonly_context.agent_name
 
-        # Filtros atualizados com os caminhos absolutos
-        pdf_filters = {
-            "especialista_fordka": [FORD_KA_PDF],
-            "especialista_fiatmobi": [MOBI_PDF],
-            "especialista_generalista": [
-                FORD_KA_PDF, 
-                MOBI_PDF
-            ]
-        }
-
         async def busca_documentos(query: str) -> str:
             """Consulta a base de dados dos manuais automotivos."""
-            pdfs_para_buscar = pdf_filters.get(agent_name, [])
+            manuais = SPECIALIST_MANUALS.get(agent_name, [])
 
-            if not pdfs_para_buscar:
+            if not manuais:
                 return "Nenhum manual configurado para este especialista."
 
-            rag = await initialize_rag(RAG_STORAGE_DIR)
-            
-            # Verifica se o arquivo realmente existe antes de tentar indexar (boa prática)
-            for pdf_path in pdfs_para_buscar:
-                if not os.path.exists(pdf_path):
-                    print(f"ERRO: Arquivo não encontrado -> {pdf_path}")
-                    continue
-                
-                await index_file(rag, pdf_path)
-
-            resp = await run_async_query(rag, query, "mix")
-            return f"[{agent_name}] Resultado da busca:\n{resp}"
+            for m in manuais:
+                report(f"Buscando no manual do {MANUALS[m]['label']}…")
+
+            # Somente leitura: a indexação roda na subida (sync_manuals) ou via CLI.
+            if len(manuais) == 1:
+                resposta = await search_manual(manuais[0], query)
+                return f"[{agent_name}] Resultado da busca:\n{resposta}"
+
+            # Cada manual é consultado no próprio workspace, em paralelo
+            return f"[{agent_name}] Resultado da busca:\n\n" + await fan_out(manuais, query)
 
         # Retorna a função genérica empacotada como ferramenta
         return [FunctionTool(func=busca_documentos)]
@@ -0,0 +1,51 @@
+"""
+Compara dois resultados do benchmark (ex.: antes e depois de uma mudança).
+
+    python -m benchmarks.compare antes.json depois.json
+"""
+import argparse
+import json
+from typing import Dict
+
+# Só estas métricas entram na comparação; o resto do JSON é contexto
+KEYS = ("mean", "p50", "p95", "p99", "pages_per_s", "chunks_per_s", "peak_rss_mb", "children_peak_rss_mb")
+
+
+def flatten(data: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in data.items():
+        path = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(flatten(value, path))
+        elif isinstance(value, (int, float)) and key in KEYS:
+            flat[path] = float(value)
+    return flat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compara dois JSONs de benchmarks.run.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+    old, new = flatten({k: v for k, v in before.items() if k != "meta"}), flatten(
+        {k: v for k, v in after.items() if k != "meta"}
+    )
+    width = max(len(k) for k in old.keys() | new.keys())
+    for key in sorted(old.keys() | new.keys()):
+        a, b = old.get(key), new.get(key)
+        if a is None or b is None:
+            print(f"{key:<{width}}  {a if a is not None else '-':>12}  {b if b is not None else '-':>12}")
+            continue
+        change = f"{(b - a) / a * 100:+.1f}%" if a else "-"
+        print(f"{key:<{width}}  {a:>12.4f}  {b:>12.4f}  {change:>8}")
+
+
+if __name__ == "__main__":
+    main()
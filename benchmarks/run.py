@@ -0,0 +1,255 @@
+"""
+Benchmark offline do pipeline: indexação (index_file), busca (run_async_query)
+e turnos completos do CarHelperMasterAgent, com LLM e embeddings falsos.
+
+    python -m benchmarks.run --llm-latency 0.05 --pages 12
+    python -m benchmarks.compare benchmarks/results/antes.json benchmarks/results/depois.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+# Sem servidor Neo4j no benchmark; precisa valer antes de importar a configuração
+os.environ.setdefault("CARHELPER_GRAPH_STORAGE", "NetworkXStorage")
+
+from benchmarks import stubs
+from benchmarks.corpus import QUESTIONS, build_manual
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def summarize(values: Iterable[float]) -> Dict[str, float]:
+    values = list(values)
+    if not values:
+        return {"n": 0}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "n": len(values),
+        "mean": float(arr.mean()),
+        "p50": float(np.percentile(arr, 50)),
+        "p95": float(np.percentile(arr, 95)),
+        "p99": float(np.percentile(arr, 99)),
+        "max": float(arr.max()),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconhecido"
+
+
+async def bench_ingestion(storage_dir: str) -> Dict[str, float]:
+    from agents.plugins.engine import get_rag
+    from agents.plugins.ingestion import index_file
+    from agents.plugins.manifest import IngestionManifest, workspace_dir
+    from agents.tools.config import MANUALS
+
+    per_file, pages, chunks, total = [], 0, 0, 0.0
+    for manual, spec in MANUALS.items():
+        rag = await get_rag(storage_dir, workspace=manual)
+        started = time.perf_counter()
+        await index_file(rag, spec["path"], force=True)
+        elapsed = time.perf_counter() - started
+        per_file.append(elapsed)
+        total += elapsed
+
+        entry = IngestionManifest(workspace_dir(storage_dir, manual)).get(spec["path"])
+        doc_ids = entry.doc_ids if entry else []
+        pages += len(doc_ids)
+        statuses = await rag.doc_status.get_by_ids(doc_ids)
+        chunks += sum((s or {}).get("chunks_count", 0) or 0 for s in statuses)
+
+    return {
+        "files": len(per_file),
+        "pages": pages,
+        "chunks": chunks,
+        "seconds": total,
+        "pages_per_s": pages / total if total else 0.0,
+        "chunks_per_s": chunks / total if total else 0.0,
+        "seconds_per_file": summarize(per_file),
+    }
+
+
+async def bench_retrieval(storage_dir: str, questions: List[str]) -> Dict[str, dict]:
+    from lightrag.prompt import PROMPTS
+
+    from agents.plugins.engine import get_rag
+    from agents.plugins.retrieve import run_async_query
+    from agents.tools.config import MANUALS
+
+    # Cumprimentos curtos nunca chegam à busca
+    questions = [q for q in questions if len(q.split()) > 3]
+    latencies, empty = [], 0
+    for manual in MANUALS:
+        rag = await get_rag(storage_dir, workspace=manual)
+        for question in questions:
+            started = time.perf_counter()
+            context = await run_async_query(rag, question, "mix", only_need_context=True, use_cache=False)
+            latencies.append(time.perf_counter() - started)
+            empty += context == PROMPTS["fail_response"]
+    # Sem nenhum trecho recuperado, só o caminho de "sem resultado" foi medido
+    if latencies and empty == len(latencies):
+        raise RuntimeError("Nenhuma busca do benchmark recuperou trechos; confira os stubs de embeddings e palavras-chave.")
+    return {"query": summarize(latencies), "queries": len(latencies), "empty": empty}
+
+
+async def bench_turns(questions: List[str], repeat: int, streaming: bool) -> Dict[str, object]:
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    from google.adk.runners import Runner
+    from google.adk.sessions import InMemorySessionService
+    from google.genai import types
+
+    from agents.master.agent import app
+
+    service = InMemorySessionService()
+    runner = Runner(app=app, session_service=service)
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE)
+
+    latency, first_event, calls, tokens, rounds = [], [], [], [], []
+    llm_latency: Dict[str, List[float]] = defaultdict(list)
+    reasons, routes = Counter(), Counter()
+    cache_hits = 0
+
+    for _ in range(repeat):
+        for question in questions:
+            session = await service.create_session(app_name="master", user_id="bench")
+            stubs.meter.reset()
+            started, first = time.perf_counter(), None
+            async for _event in runner.run_async(
+                user_id="bench",
+                session_id=session.id,
+                new_message=types.Content(role="user", parts=[types.Part(text=question)]),
+                run_config=run_config,
+            ):
+                if first is None:
+                    first = time.perf_counter() - started
+            latency.append(time.perf_counter() - started)
+            first_event.append(first or latency[-1])
+
+            state = (await service.get_session(app_name="master", user_id="bench", session_id=session.id)).state
+            calls.append(stubs.meter.total_calls())
+            tokens.append(stubs.meter.total_tokens())
+            rounds.append(state.get("quality_rounds", 0))
+            reasons[str(state.get("quality_reason"))] += 1
+            routes[state.get("rota", "recepcionista")] += 1
+            cache_hits += bool(state.get("cache_hit"))
+            for role, values in stubs.meter.latencies.items():
+                llm_latency[role].extend(values)
+
+    return {
+        "turns": len(latency),
+        "latency": summarize(latency),
+        "first_event": summarize(first_event),
+        "llm_calls": summarize(calls),
+        "tokens": summarize(tokens),
+        "quality_rounds": summarize(rounds),
+        "quality_reason": dict(reasons),
+        "routes": dict(routes),
+        "answer_cache_hits": cache_hits,
+        "llm_latency": {role: summarize(values) for role, values in sorted(llm_latency.items())},
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, object]:
+    backend = stubs.install(
+        llm_latency=args.llm_latency,
+        embed_latency=args.embed_latency,
+        embed_dim=args.embed_dim,
+        rewrite_rounds=args.rewrite_rounds,
+    )
+
+    # Importados depois dos stubs: os agentes criam o modelo na importação
+    import agents.tools.config as config
+    from agents.plugins import answer_cache
+    from agents.plugins.engine import registry
+    from agents.plugins.extraction import shutdown_extraction_pool
+    from agents.plugins.ingestion import DEFAULT_STORAGES
+    from agents.tools import toolset
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="carhelper-bench-")
+    storage_dir = os.path.join(work_dir, "rag_storage")
+    toolset.RAG_STORAGE_DIR = storage_dir
+    for manual, spec in config.MANUALS.items():
+        spec["path"] = build_manual(os.path.join(work_dir, "manuais", f"{manual}.pdf"), spec["label"], args.pages)
+    answer_cache._answer_cache = answer_cache.SemanticAnswerCache(
+        os.path.join(work_dir, "cache", "answers.db"), embed=config._embedding, model=backend.name
+    )
+
+    questions = QUESTIONS[: args.questions] if args.questions else QUESTIONS
+    try:
+        ingestion = await bench_ingestion(storage_dir)
+        retrieval = await bench_retrieval(storage_dir, questions)
+        turns = await bench_turns(questions, args.repeat, args.streaming)
+    finally:
+        await registry.shutdown()
+        shutdown_extraction_pool()
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "args": vars(args),
+            "storages": DEFAULT_STORAGES,
+            "work_dir": work_dir,
+        },
+        "ingestion": ingestion,
+        "retrieval": retrieval,
+        "agent": turns,
+        "embeddings": {"backend_calls": backend.calls, "texts": backend.texts},
+        "memory": {
+            # ru_maxrss é em KiB no Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "children_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        },
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark offline do CarHelper com LLM/embeddings falsos.")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Latência de cada chamada ao LLM (s)")
+    parser.add_argument("--embed-latency", type=float, default=0.01, help="Latência de cada lote de embeddings (s)")
+    parser.add_argument("--embed-dim", type=int, default=384)
+    parser.add_argument("--rewrite-rounds", type=int, default=1, help="Reescritas da didática antes de aprovar")
+    parser.add_argument("--pages", type=int, default=12, help="Páginas de cada manual sintético")
+    parser.add_argument("--questions", type=int, default=0, help="Usa só as N primeiras perguntas (0 = todas)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passadas pelo corpus (as seguintes usam o cache)")
+    parser.add_argument("--streaming", action="store_true", help="Roda os turnos com StreamingMode.SSE")
+    parser.add_argument("--work-dir", default="", help="Diretório dos dados gerados (padrão: temporário)")
+    parser.add_argument("--output", default="", help="Arquivo JSON (padrão: benchmarks/results/<data>-<commit>.json)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{result['meta']['commit']}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    agent, ingestion = result["agent"], result["ingestion"]
+    print(f"Turnos: p50 {agent['latency']['p50']:.3f}s  p95 {agent['latency']['p95']:.3f}s  p99 {agent['latency']['p99']:.3f}s")
+    print(f"LLM por turno: {agent['llm_calls']['mean']:.1f} chamadas, {agent['tokens']['mean']:.0f} tokens")
+    print(f"Rodadas de qualidade: média {agent['quality_rounds']['mean']:.2f}")
+    print(f"Indexação: {ingestion['pages_per_s']:.2f} páginas/s, {ingestion['chunks_per_s']:.2f} chunks/s")
+    print(f"Pico de RSS: {result['memory']['peak_rss_mb']:.0f} MB")
+    print(f"Resultado: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+LLM e embeddings falsos, com latência configurável, para medir o pipeline
+sem rede. `install()` precisa rodar antes de importar os agentes, porque eles
+chamam `configure_model()` na importação.
+"""
+import asyncio
+import hashlib
+import json
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import AsyncGenerator, Dict, List, Optional
+
+import numpy as np
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from benchmarks.corpus import TOPICS
+
+
+def count_tokens(text: str) -> int:
+    # Aproximação usual de ~4 caracteres por token
+    return max(1, len(text) // 4)
+
+
+@dataclass
+class LlmMeter:
+    """Chamadas e tokens por papel (agente ou LightRAG), acumulados até reset()."""
+
+    calls: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    prompt_tokens: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    completion_tokens: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: defaultdict(list))
+
+    def record(self, role: str, prompt: int, completion: int, seconds: float) -> None:
+        self.calls[role] += 1
+        self.prompt_tokens[role] += prompt
+        self.completion_tokens[role] += completion
+        self.latencies[role].append(seconds)
+
+    def total_calls(self, prefix: str = "") -> int:
+        return sum(n for role, n in self.calls.items() if role.startswith(prefix))
+
+    def total_tokens(self, prefix: str = "") -> int:
+        return sum(
+            self.prompt_tokens[r] + self.completion_tokens[r] for r in self.calls if r.startswith(prefix)
+        )
+
+    def reset(self) -> None:
+        self.calls.clear()
+        self.prompt_tokens.clear()
+        self.completion_tokens.clear()
+        self.latencies.clear()
+
+
+meter = LlmMeter()
+
+
+# Papel do agente pelo trecho característico da instrução
+ROLES = [
+    ("recepcionista", "recepcionista"),
+    ("Fornecer respostas precisas", "especialista"),
+    ("STATUS: BLOQUEADO|SEGURO", "seguranca"),
+    ("Você avalia e, se necessário", "didatica"),
+    ("Retorne ao usuário apenas o texto final", "final"),
+]
+
+CAR_LABELS = ("Ford KA", "Fiat Mobi")
+
+INJECTION = re.compile(r"ignore (?:as|todas as) instru|prompt do sistema|chave da api", re.IGNORECASE)
+
+
+def _role(request: LlmRequest) -> str:
+    instruction = str(request.config.system_instruction or "") if request.config else ""
+    for marker, role in ROLES:
+        if marker in instruction:
+            return role
+    return "desconhecido"
+
+
+def _turn(request: LlmRequest) -> tuple[str, List[types.Part]]:
+    """Texto do usuário do turno atual e as partes geradas depois dele."""
+    question, after = "", []
+    for content in request.contents:
+        texts = [p.text for p in content.parts or [] if p.text]
+        if content.role == "user" and texts and not any(p.function_response for p in content.parts):
+            question, after = " ".join(texts), []
+        else:
+            after.extend(content.parts or [])
+    return question, after
+
+
+def _called(parts: List[types.Part], name: str) -> bool:
+    return any(p.function_response and p.function_response.name == name for p in parts)
+
+
+class StubLlm(BaseLlm):
+    """
+    Modelo do ADK que imita cada agente do CarHelper de forma determinística:
+    o recepcionista chama o especialista, o especialista chama busca_documentos,
+    a segurança aprova (ou bloqueia injeções óbvias) e a didática reescreve
+    `rewrite_rounds` vezes antes de aprovar.
+    """
+
+    model: str = "stub"
+    latency: float = 0.05
+    rewrite_rounds: int = 1
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        started = time.perf_counter()
+        role = _role(llm_request)
+        question, after = _turn(llm_request)
+        await asyncio.sleep(self.latency)
+
+        parts = self._respond(role, question, after, llm_request)
+        prompt = count_tokens(str(llm_request.config.system_instruction or "")) + sum(
+            count_tokens(p.text or "") for c in llm_request.contents for p in c.parts or []
+        )
+        completion = sum(count_tokens(p.text or str(p.function_call or "")) for p in parts)
+        meter.record(f"agente:{role}", prompt, completion, time.perf_counter() - started)
+
+        yield LlmResponse(
+            content=types.Content(role="model", parts=parts),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=prompt,
+                candidates_token_count=completion,
+                total_token_count=prompt + completion,
+            ),
+        )
+
+    def _respond(self, role: str, question: str, after: List[types.Part], request: LlmRequest) -> List[types.Part]:
+        tools = set(request.tools_dict)
+
+        if role == "recepcionista":
+            if after:
+                return [types.Part(text="Encaminhei sua pergunta ao especialista.")]
+            text = question.lower()
+            if "ka" in text.split() or "ford" in text:
+                name = "especialista_fordka" if "mobi" not in text else "especialista_generalista"
+            elif "mobi" in text or "fiat" in text:
+                name = "especialista_fiatmobi"
+            elif "mark_flow_done" in tools and len(text.split()) <= 3:
+                return [types.Part(function_call=types.FunctionCall(name="mark_flow_done", args={}))]
+            else:
+                name = "especialista_generalista"
+            return [types.Part(function_call=types.FunctionCall(name=name, args={"request": question}))]
+
+        if role == "especialista":
+            if not _called(after, "busca_documentos"):
+                return [types.Part(function_call=types.FunctionCall(name="busca_documentos", args={"query": question}))]
+            return [types.Part(text=f"Segundo o manual (manual.pdf#page=1): resposta para '{question}'.")]
+
+        if role == "seguranca":
+            if INJECTION.search(question):
+                return [types.Part(text="STATUS: BLOQUEADO\nMOTIVO: tentativa de prompt injection.")]
+            return [types.Part(text="STATUS: SEGURO\nMOTIVO: pergunta sobre o carro.")]
+
+        if role == "didatica":
+            if _called(after, "mark_quality_done"):
+                return [types.Part(text="Resposta aprovada.")]
+            instruction = str(request.config.system_instruction or "")
+            if "BLOQUEADO" in instruction.split("Resultado de segurança:")[-1].split("\n")[0]:
+                return [types.Part(function_call=types.FunctionCall(name="mark_quality_done", args={}))]
+            if instruction.count("[revisado]") >= self.rewrite_rounds:
+                return [types.Part(function_call=types.FunctionCall(name="mark_quality_done", args={}))]
+            return [types.Part(text="[revisado] Versão mais clara da resposta.")]
+
+        if role == "final":
+            return [types.Part(text="Aqui está a resposta, de forma simples: consulte o manual para detalhes.")]
+
+        return [types.Part(text="ok")]
+
+
+async def stub_complete(
+    prompt: str,
+    system_prompt: Optional[str] = None,
+    history_messages: Optional[list] = None,
+    keyword_extraction: bool = False,
+    latency: float = 0.05,
+    **kwargs,
+) -> str:
+    """llm_model_func do LightRAG: extração de entidades, palavras-chave e respostas."""
+    started = time.perf_counter()
+    await asyncio.sleep(latency)
+    text = f"{system_prompt or ''}\n{prompt}"
+
+    if keyword_extraction or kwargs.get("response_format") or "high_level_keywords" in text:
+        # Palavras de conteúdo da pergunta ("User Query: ..."), não do modelo do prompt
+        query = re.findall(r"User Query:(.*)", prompt)
+        words = [w for w in re.findall(r"\w+", query[-1] if query else prompt) if _term(w)]
+        topics = [w for w in words if _term(w) in CORPUS_TERMS]
+        result = json.dumps({"high_level_keywords": topics or words[:2], "low_level_keywords": words})
+        role = "lightrag:keywords"
+    elif "<|COMPLETE|>" in text and "entity<|#|>" in text:
+        # Entidades: os tópicos dos manuais citados no trecho (fim do prompt) e o
+        # modelo do carro, relacionados entre si, como faria um LLM de verdade
+        excerpt = prompt[-3000:]
+        names = [topic.capitalize() for topic in TOPICS if topic in excerpt.lower()][:3]
+        names += [label for label in CAR_LABELS if label in excerpt][:1]
+        lines = [f"entity<|#|>{n}<|#|>component<|#|>{n} descrito no manual." for n in names]
+        lines += [
+            f"relation<|#|>{names[-1]}<|#|>{n}<|#|>manutenção<|#|>{n} do {names[-1]}, relacionados no manual."
+            for n in names[:-1]
+        ]
+        result = "\n".join(lines + ["<|COMPLETE|>"])
+        role = "lightrag:extracao"
+    else:
+        result = "Resumo gerado a partir do contexto recuperado."
+        role = "lightrag:resposta"
+
+    meter.record(role, count_tokens(text), count_tokens(result), time.perf_counter() - started)
+    return result
+
+
+STOPWORDS = {
+    "qual", "quais", "como", "onde", "quanto", "quando", "para", "pela", "pelo", "com", "sem",
+    "que", "uma", "uns", "dos", "das", "nos", "nas", "meu", "minha", "este", "esta", "isso",
+    "posso", "devo", "fazer", "pode", "ser", "tem", "fica", "funciona", "entre",
+}
+
+def _term(word: str) -> str:
+    """Radical (5 letras, sem acento) de uma palavra de conteúdo; '' para as demais."""
+    word = unicodedata.normalize("NFKD", word.lower())
+    word = "".join(c for c in word if c.isalpha() and not unicodedata.combining(c))
+    if len(word) < 3 or word in STOPWORDS:
+        return ""
+    return word[:5]
+
+
+# Termos dos tópicos dos manuais sintéticos: pesam mais no embedding, para uma
+# pergunta sobre "pressão dos pneus" achar o capítulo correspondente
+CORPUS_TERMS = {term for topic in TOPICS for term in map(_term, topic.split()) if term}
+
+
+class TermEmbeddingBackend:
+    """
+    Backend de embeddings determinístico: soma de vetores fixos (por hash) dos
+    radicais do texto, com peso maior para os termos do corpus. Textos que
+    compartilham termos ficam próximos, então a busca do LightRAG encontra
+    trechos acima do limiar de cosseno.
+    """
+
+    def __init__(self, dim: int = 384, latency: float = 0.01, corpus_weight: float = 3.0):
+        self.name = f"stub/terms-{dim}"
+        self.dim = dim
+        self.latency = latency
+        self.corpus_weight = corpus_weight
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, term: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(term.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        self.calls += 1
+        self.texts += len(texts)
+        await asyncio.sleep(self.latency)
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            terms = set(filter(None, map(_term, re.findall(r"\w+", text)))) or {text}
+            for term in terms:
+                vectors[i] += self._vector(term) * (self.corpus_weight if term in CORPUS_TERMS else 1.0)
+            vectors[i] /= np.linalg.norm(vectors[i])
+        return vectors
+
+
+class CharTokenizer:
+    """Tokenizador por caractere: evita baixar o vocabulário do tiktoken."""
+
+    def encode(self, content: str) -> List[int]:
+        return [ord(c) for c in content]
+
+    def decode(self, tokens: List[int]) -> str:
+        return "".join(chr(t) for t in tokens)
+
+
+def install(
+    llm_latency: float = 0.05,
+    embed_latency: float = 0.01,
+    embed_dim: int = 384,
+    rewrite_rounds: int = 1,
+) -> TermEmbeddingBackend:
+    """Troca modelo, embeddings e LLM do LightRAG pelos stubs (antes de importar os agentes)."""
+    from functools import partial
+
+    from lightrag import LightRAG
+    from lightrag.utils import EmbeddingFunc, Tokenizer
+
+    import agents.tools.config as config
+    from agents.plugins import ingestion
+    from agents.plugins.embedding import CachedEmbedder
+
+    model = StubLlm(latency=llm_latency, rewrite_rounds=rewrite_rounds)
+    config.configure_model = lambda: model
+
+    backend = TermEmbeddingBackend(embed_dim, embed_latency)
+    config._embedding = EmbeddingFunc(embedding_dim=backend.dim, max_token_size=8192, func=CachedEmbedder(backend))
+
+    llm_func = partial(stub_complete, latency=llm_latency)
+    tokenizer = Tokenizer("chars", CharTokenizer())
+
+    def lightrag(**kwargs) -> LightRAG:
+        return LightRAG(**{**kwargs, "llm_model_func": llm_func, "tokenizer": tokenizer})
+
+    ingestion.LightRAG = lightrag
+    return backend
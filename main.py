@@ -1,14 +1,129 @@
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
 import uvicorn
-from google.adk.cli.fast_api import get_fast_api_app
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
+from google.adk.cli.fast_api import NestedAgentLoader, get_fast_api_app
+
+from agents.plugins.answer_cache import get_answer_cache
+from agents.plugins.engine import registry
+from agents.plugins.retrieve import retrieval_cache
+from agents.plugins.extraction import shutdown_extraction_pool
+from agents.plugins.sessions import compaction_loop, flush_sessions, register_session_service, session_db_kwargs
+from agents.plugins.telemetry import render_metrics
+from agents.plugins import warmup
+from agents.tools.config import SERVER_WORKERS, SESSION_DB_URL, configure_embedding
+from agents.tools.toolset import sync_manuals
 
 AGENT_DIR = "agents/"
 
+# O mesmo loader que o ADK usa nas requisições: aquecê-lo deixa o grafo de agentes em cache
+agent_loader = NestedAgentLoader(AGENT_DIR)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # O uvicorn só aceita conexões depois deste aquecimento; se falhar, o
+    # processo sobe sem ficar pronto (/readyz 503) e tenta de novo em segundo plano
+    # Indexa só manuais novos/alterados; desative com CARHELPER_INDEX_ON_STARTUP=0
+    index = os.getenv("CARHELPER_INDEX_ON_STARTUP", "1") != "0"
+    retry = None
+    if not await warmup.warm_up(agent_loader, index=index):
+        retry = asyncio.create_task(warmup.retry_until_ready(agent_loader, index=index))
+    compaction = asyncio.create_task(compaction_loop())
+    yield
+    compaction.cancel()
+    if retry is not None:
+        retry.cancel()
+    await flush_sessions()
+    await registry.shutdown()
+    shutdown_extraction_pool()
+
+
+# Sessões em WAL, com pool e eventos gravados por turno (agents/plugins/sessions.py)
+register_session_service()
+
 api = get_fast_api_app(
     agents_dir=AGENT_DIR,
-    session_service_uri="sqlite+aiosqlite:///database/dialog/dialog.db",
+    agent_loader=agent_loader,
+    session_service_uri=SESSION_DB_URL,
+    session_db_kwargs=session_db_kwargs(),
     allow_origins=["*"],
     web=True,
+    lifespan=lifespan,
 )
 
+
+@api.get("/livez")
+async def livez():
+    # O processo responde: o event loop não está travado
+    return {"live": True, "pid": os.getpid()}
+
+
+@api.get("/readyz")
+async def readyz():
+    report = warmup.state.report()
+    return JSONResponse(report, status_code=200 if warmup.state.ready else 503)
+
+
+@api.get("/rag/health")
+async def rag_health():
+    return await registry.health()
+
+
+@api.get("/cache/stats")
+async def cache_stats():
+    return {
+        "answers": get_answer_cache().stats(),
+        "retrieval": retrieval_cache.stats(),
+        "embeddings": configure_embedding().func.stats(),
+    }
+
+
+@api.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Formato texto do Prometheus; vazio enquanto CARHELPER_TELEMETRY=0
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def prepare() -> None:
+    """
+    Modo produção: indexa os manuais uma única vez, no processo pai, antes de
+    subir os workers. Os workers só leem o índice (não indexam na subida).
+    """
+
+    async def run() -> None:
+        try:
+            count = await sync_manuals()
+            print(f"Manuais indexados antes dos workers: {count}")
+        finally:
+            await registry.shutdown()
+            shutdown_extraction_pool()
+
+    asyncio.run(run())
+    os.environ["CARHELPER_INDEX_ON_STARTUP"] = "0"
+
+    unshared = warmup.unshared_storages()
+    if unshared:
+        print(
+            f"Aviso: {', '.join(unshared)} carrega uma cópia do índice em cada worker; "
+            "use SQLiteKVStorage e ShardedFaissVectorDBStorage para compartilhar via mmap/page cache."
+        )
+
+
 if __name__ == "__main__":
-    uvicorn.run("main:api", host="0.0.0.0", port=8000, reload=True)
+    parser = argparse.ArgumentParser(description="Servidor do CarHelper.")
+    parser.add_argument("--prod", action="store_true", help="Sem reload, índice preparado antes e N workers")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.prod:
+        prepare()
+        uvicorn.run("main:api", host=args.host, port=args.port, workers=args.workers, timeout_graceful_shutdown=30)
+    else:
+        uvicorn.run("main:api", host=args.host, port=args.port, reload=True)
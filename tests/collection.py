@@ -0,0 +1,10 @@
+"""Plugin do pytest (carregado pelo pytest.ini) para coletar os testes."""
+import pytest
+
+
+def pytest_collect_directory(path, parent):
+    # A raiz do repositório tem um __init__.py que não importa fora do ADK;
+    # coletada como diretório comum, o pytest não tenta importá-la como pacote
+    if path == parent.config.rootpath:
+        return pytest.Dir.from_parent(parent, path=path)
+    return None
@@ -0,0 +1,154 @@
+import asyncio
+import hashlib
+
+import numpy as np
+import pytest
+
+from agents.plugins.answer_cache import SemanticAnswerCache, cacheable_query
+
+KA = "especialista_fordka"
+MOBI = "especialista_fiatmobi"
+QUESTION = "qual a pressão dos pneus do Ka?"
+
+
+class BagOfWords:
+    """Embedding de mentira: soma de vetores fixos por palavra; conta as chamadas."""
+
+    def __init__(self, dim=64):
+        self.dim = dim
+        self.calls = 0
+
+    async def __call__(self, texts):
+        self.calls += 1
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.split():
+                seed = int(hashlib.md5(word.encode()).hexdigest()[:8], 16)
+                vectors[row] += np.random.default_rng(seed).standard_normal(self.dim)
+        return vectors
+
+
+@pytest.fixture
+def embed():
+    return BagOfWords()
+
+
+@pytest.fixture
+def cache(tmp_path, embed):
+    return SemanticAnswerCache(str(tmp_path / "answers.db"), embed=embed, model="bow")
+
+
+def v1(specialist):
+    return "v1"
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_hit_so_do_mesmo_especialista(cache):
+    async def scenario():
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        assert await cache.lookup(QUESTION, v1, specialist=MOBI) is None
+        hit = await cache.lookup("Qual a pressao dos pneus do ka", v1, specialist=KA)
+        assert hit.answer == "32 psi" and hit.similarity == 1.0
+
+    run(scenario())
+
+
+def test_pergunta_identica_nao_calcula_embedding(cache, embed):
+    async def scenario():
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        calls = embed.calls
+        assert (await cache.lookup(QUESTION, v1, specialist=KA)).answer == "32 psi"
+        # Sem entradas do especialista, também não
+        assert await cache.lookup("qual o óleo do motor do Mobi?", v1, specialist=MOBI) is None
+        assert embed.calls == calls
+
+    run(scenario())
+
+
+def test_lookup_usa_o_embedding_do_prefetch(cache, embed):
+    async def scenario():
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        query = "qual a pressão dos pneus do Ka hoje?"
+        calls = embed.calls
+        vector = cache.prefetch(query)
+        cache.threshold = 0.5
+        assert (await cache.lookup(query, v1, specialist=KA, vector=vector)).answer == "32 psi"
+        assert embed.calls == calls + 1
+
+    run(scenario())
+
+
+def test_prefetch_ignora_cache_vazio_e_perguntas_de_continuacao(cache):
+    async def scenario():
+        assert cache.prefetch(QUESTION) is None
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        assert cache.prefetch("e do Mobi?") is None
+        vector = cache.prefetch(QUESTION)
+        assert vector is not None
+        await vector
+
+    run(scenario())
+
+
+@pytest.mark.parametrize("text", ["e o torque?", "e do Mobi?", "obrigado pela ajuda amigo", "oi tudo bem com voce"])
+def test_perguntas_que_dependem_da_conversa_nao_entram(text):
+    assert not cacheable_query(text)
+
+
+def test_nova_versao_do_manual_invalida_a_resposta(cache):
+    async def scenario():
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        assert await cache.lookup(QUESTION, lambda spec: "v2", specialist=KA) is None
+
+    run(scenario())
+
+
+def test_entrada_expirada_nao_e_hit(cache):
+    async def scenario():
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        cache.ttl_seconds = 0
+        assert await cache.lookup(QUESTION, v1, specialist=KA) is None
+
+    run(scenario())
+
+
+def test_evicao_remove_a_menos_usada(cache, tmp_path, embed):
+    async def scenario():
+        cache.max_entries = 2
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        await cache.store("como trocar o óleo do Ka?", KA, "óleo", "v1")
+        # A primeira passa a ser a mais recente
+        assert await cache.lookup(QUESTION, v1, specialist=KA) is not None
+        await cache.store("como trocar a lâmpada do Mobi?", MOBI, "lâmpada", "v1")
+
+        assert cache.stats()["entries"] == 2
+        assert await cache.lookup("como trocar o óleo do Ka?", v1, specialist=KA) is None
+        assert await cache.lookup(QUESTION, v1, specialist=KA) is not None
+
+        # O índice em memória bate com o que foi persistido
+        reloaded = SemanticAnswerCache(cache.db_path, embed=embed, model="bow")
+        assert sorted(reloaded._ids) == sorted(cache._ids)
+
+    run(scenario())
+
+
+def test_mesma_pergunta_substitui_a_resposta(cache):
+    async def scenario():
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        await cache.store(QUESTION, KA, "33 psi", "v1")
+        assert cache.stats()["entries"] == 1
+        assert (await cache.lookup(QUESTION, v1, specialist=KA)).answer == "33 psi"
+
+    run(scenario())
+
+
+def test_modelo_de_embedding_diferente_ignora_as_entradas(cache, embed):
+    async def scenario():
+        await cache.store(QUESTION, KA, "32 psi", "v1")
+        other = SemanticAnswerCache(cache.db_path, embed=embed, model="outro")
+        assert await other.lookup(QUESTION, v1, specialist=KA) is None
+
+    run(scenario())
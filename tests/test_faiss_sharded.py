@@ -0,0 +1,119 @@
+import asyncio
+import glob
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+from lightrag.utils import EmbeddingFunc
+
+from agents.plugins.storage.faiss_sharded import ShardedFaissVectorDBStorage
+
+DIM = 16
+WORDS = ["pneu", "óleo", "freio", "bateria", "farol", "motor"]
+
+
+async def one_hot(texts, **kwargs):
+    """Cada palavra conhecida vira um eixo: a busca por "pneu" acha o registro "pneu"."""
+    vectors = np.full((len(texts), DIM), 0.01, dtype=np.float32)
+    for row, text in enumerate(texts):
+        vectors[row, WORDS.index(text.split()[0]) if text.split()[0] in WORDS else DIM - 1] = 1.0
+    return vectors
+
+
+def storage(tmp_path, **kwargs):
+    return ShardedFaissVectorDBStorage(
+        namespace="chunks",
+        workspace="fordka",
+        global_config={
+            "working_dir": str(tmp_path),
+            "embedding_batch_num": 4,
+            "vector_db_storage_cls_kwargs": kwargs,
+        },
+        embedding_func=EmbeddingFunc(embedding_dim=DIM, func=one_hot),
+        meta_fields={"content"},
+    )
+
+
+def shard_files(store):
+    return sorted(os.path.basename(p) for p in glob.glob(os.path.join(store._dir, "shard-*")))
+
+
+async def ids_for(store, query):
+    return [r["id"] for r in await store.query(query, top_k=3)]
+
+
+def test_cada_flush_grava_um_shard_e_a_busca_ve_todos(tmp_path):
+    async def scenario():
+        store = storage(tmp_path)
+        await store.upsert({"c-pneu": {"content": "pneu 30 psi"}})
+        await store.index_done_callback()
+        await store.upsert({"c-oleo": {"content": "óleo 5W30"}})
+        await store.index_done_callback()
+
+        assert shard_files(store) == ["shard-000000.index", "shard-000001.index"]
+        assert (await ids_for(store, "pneu"))[0] == "c-pneu"
+        assert (await ids_for(store, "óleo"))[0] == "c-oleo"
+        # Outro processo abre os mesmos shards
+        assert (await ids_for(storage(tmp_path), "óleo"))[0] == "c-oleo"
+
+    asyncio.run(scenario())
+
+
+def test_remocao_some_da_busca_e_das_leituras(tmp_path):
+    async def scenario():
+        store = storage(tmp_path)
+        await store.upsert({"c-pneu": {"content": "pneu"}, "c-freio": {"content": "freio"}})
+        await store.index_done_callback()
+        await store.delete(["c-pneu"])
+        # Antes do flush, a leitura já reflete a remoção
+        assert await store.get_by_id("c-pneu") is None
+        await store.index_done_callback()
+
+        assert "c-pneu" not in await ids_for(store, "pneu")
+        assert (await store.get_by_id("c-freio"))["content"] == "freio"
+
+    asyncio.run(scenario())
+
+
+def test_acima_do_limite_compacta_em_um_shard(tmp_path):
+    async def scenario():
+        store = storage(tmp_path, max_shards=2)
+        for word in ("pneu", "óleo"):
+            await store.upsert({f"c-{word}": {"content": word}})
+            await store.index_done_callback()
+        # O terceiro shard passa do limite; o vetor removido fica de fora
+        await store.delete(["c-óleo"])
+        await store.upsert({"c-freio": {"content": "freio"}})
+        await store.index_done_callback()
+
+        assert shard_files(store) == ["shard-000003.index"]
+        assert store._conn.execute("SELECT ntotal FROM shards").fetchall() == [(2,)]
+        assert (await ids_for(store, "freio"))[0] == "c-freio"
+        assert "c-óleo" not in await ids_for(store, "óleo")
+
+    asyncio.run(scenario())
+
+
+def test_orfaos_so_sao_removidos_sem_escrita_em_andamento(tmp_path):
+    async def scenario():
+        store = storage(tmp_path)
+        await store.upsert({"c-pneu": {"content": "pneu"}})
+        await store.index_done_callback()
+        orphan = os.path.join(store._dir, "shard-000001.index")
+        open(orphan, "wb").close()
+
+        # Outro processo no meio de um flush: o arquivo pode ser o shard dele
+        writer = sqlite3.connect(os.path.join(store._dir, "meta.db"))
+        writer.execute("BEGIN IMMEDIATE")
+        store._conn.execute("PRAGMA busy_timeout = 0")
+        with pytest.raises(sqlite3.OperationalError):
+            store._reap_orphan_files()
+        assert os.path.exists(orphan)
+
+        writer.rollback()
+        store._reap_orphan_files()
+        assert not os.path.exists(orphan)
+        assert shard_files(store) == ["shard-000000.index"]
+
+    asyncio.run(scenario())
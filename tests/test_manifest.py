@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from agents.plugins import ingestion
+from agents.plugins.ingestion import sync_file
+from agents.plugins.manifest import MANIFEST_NAME, IngestionManifest, _read_cache
+
+MINI_LM = ("st/paraphrase-multilingual-MiniLM-L12-v2", 384)
+OPENAI = ("openai/text-embedding-3-small", 1536)
+
+
+class FakeRAG:
+    """Registra inserções e remoções de documentos."""
+
+    def __init__(self):
+        self.inserted = []
+        self.deleted = []
+        self.file_paths = []
+
+    async def ainsert(self, texts, ids=None, file_paths=None):
+        self.inserted.extend(ids)
+        self.file_paths.extend(file_paths)
+
+    async def adelete_by_doc_id(self, doc_id):
+        self.deleted.append(doc_id)
+
+
+@pytest.fixture
+def manual(tmp_path):
+    path = tmp_path / "manual.txt"
+    path.write_text("Calibre os pneus com 30 psi.\n", encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def embedding(monkeypatch):
+    current = {"value": MINI_LM}
+    monkeypatch.setattr(ingestion, "embedding_signature", lambda: current["value"])
+    return current
+
+
+def sync(manifest, path, force=False):
+    rag = FakeRAG()
+    changed = asyncio.run(sync_file(rag, manifest, str(path), force=force))
+    return changed, rag
+
+
+def test_arquivo_e_modelo_iguais_nao_reindexam(tmp_path, manual, embedding):
+    manifest = IngestionManifest(str(tmp_path))
+    assert sync(manifest, manual)[0] is True
+    changed, rag = sync(manifest, manual)
+    assert changed is False and rag.inserted == []
+
+    # O modelo fica registrado no arquivo do manifesto
+    saved = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    entry = saved[os.path.abspath(manual)]
+    assert (entry["embedding_model"], entry["embedding_dim"]) == MINI_LM
+
+
+@pytest.mark.parametrize("other", [OPENAI, (MINI_LM[0], 768), ("st/outro-modelo", 384)])
+def test_outro_modelo_ou_dimensao_reindexa(tmp_path, manual, embedding, other):
+    manifest = IngestionManifest(str(tmp_path))
+    sync(manifest, manual)
+    old_ids = manifest.get(str(manual)).doc_ids
+
+    embedding["value"] = other
+    changed, rag = sync(manifest, manual)
+    assert changed is True
+    assert rag.deleted == old_ids
+    assert (manifest.get(str(manual)).embedding_model, manifest.get(str(manual)).embedding_dim) == other
+
+
+def test_manifesto_sem_modelo_reindexa(tmp_path, manual, embedding):
+    manifest = IngestionManifest(str(tmp_path))
+    sync(manifest, manual)
+    # Manifesto gravado antes de o modelo ser registrado
+    raw = json.loads((tmp_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    for entry in raw.values():
+        del entry["embedding_model"], entry["embedding_dim"]
+    (tmp_path / MANIFEST_NAME).write_text(json.dumps(raw), encoding="utf-8")
+
+    assert sync(IngestionManifest(str(tmp_path)), manual)[0] is True
+
+
+def test_file_path_citavel_sem_o_diretorio(tmp_path, manual, embedding):
+    _, rag = sync(IngestionManifest(str(tmp_path)), manual)
+    assert rag.file_paths == ["manual.txt#page=1"]
+
+
+def test_mtime_novo_com_mesmo_conteudo_nao_reindexa(tmp_path, manual, embedding):
+    manifest = IngestionManifest(str(tmp_path))
+    sync(manifest, manual)
+    stat = os.stat(manual)
+    os.utime(manual, (stat.st_atime, stat.st_mtime + 60))
+
+    assert sync(manifest, manual)[0] is False
+    assert manifest.get(str(manual)).mtime == stat.st_mtime + 60
+
+
+def test_conteudo_novo_reindexa(tmp_path, manual, embedding):
+    manifest = IngestionManifest(str(tmp_path))
+    sync(manifest, manual)
+    manual.write_text("Calibre os pneus com 32 psi.\n", encoding="utf-8")
+
+    changed, rag = sync(manifest, manual)
+    assert changed is True and len(rag.deleted) == 1 and len(rag.inserted) == 1
+
+
+def test_manual_version_muda_com_o_modelo(tmp_path, manual, embedding, monkeypatch):
+    from agents.tools import toolset
+
+    monkeypatch.setattr(toolset, "RAG_STORAGE_DIR", str(tmp_path))
+    monkeypatch.setitem(toolset.MANUALS["fordka"], "path", str(manual))
+    manifest = IngestionManifest(str(tmp_path / "fordka"))
+
+    sync(manifest, manual)
+    before = toolset.manual_version("especialista_fordka")
+    embedding["value"] = OPENAI
+    sync(manifest, manual)
+    # Sem a cópia em cache, o manifesto somente leitura é relido mesmo com o mesmo mtime
+    _read_cache.clear()
+
+    after = toolset.manual_version("especialista_fordka")
+    assert before != after
+    assert OPENAI[0] in after and str(OPENAI[1]) in after
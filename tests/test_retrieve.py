@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+from agents.plugins import retrieve
+from agents.plugins.retrieve import RetrievalCache, run_async_query
+
+
+class FakeRAG:
+    """LightRAG de mentira: cada aquery espera `release` e registra cancelamentos."""
+
+    working_dir = "/tmp/rag"
+    workspace = "fordka"
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.params = []
+        self.release = asyncio.Event()
+
+    async def aquery(self, question, param=None):
+        self.calls += 1
+        self.params.append(param)
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return f"contexto: {question}"
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    retrieve.retrieval_cache.clear()
+    retrieve._inflight.clear()
+    yield
+    retrieve.retrieval_cache.clear()
+    retrieve._inflight.clear()
+
+
+def test_consultas_iguais_compartilham_uma_chamada():
+    async def scenario():
+        rag = FakeRAG()
+        first = asyncio.ensure_future(run_async_query(rag, "óleo do motor", "mix"))
+        second = asyncio.ensure_future(run_async_query(rag, "Óleo do motor?", "mix"))
+        await asyncio.sleep(0)
+        rag.release.set()
+        assert await first == await second == "contexto: óleo do motor"
+        assert rag.calls == 1
+        # Depois, o resultado vem do cache
+        assert await run_async_query(rag, "óleo do motor", "mix") == "contexto: óleo do motor"
+        assert rag.calls == 1
+
+    asyncio.run(scenario())
+
+
+def test_cancelar_um_chamador_nao_cancela_os_outros():
+    async def scenario():
+        rag = FakeRAG()
+        first = asyncio.ensure_future(run_async_query(rag, "pneu", "mix"))
+        second = asyncio.ensure_future(run_async_query(rag, "pneu", "mix"))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        rag.release.set()
+        assert await second == "contexto: pneu"
+        assert rag.cancelled == 0
+
+    asyncio.run(scenario())
+
+
+def test_ultimo_chamador_cancelado_cancela_a_consulta():
+    async def scenario():
+        rag = FakeRAG()
+        callers = [asyncio.ensure_future(run_async_query(rag, "freio", "mix")) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert rag.cancelled == 1
+        assert not retrieve._inflight
+
+        # Um chamador novo não herda a consulta cancelada
+        again = asyncio.ensure_future(run_async_query(rag, "freio", "mix"))
+        await asyncio.sleep(0)
+        rag.release.set()
+        assert await again == "contexto: freio"
+        assert rag.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_timeout_cancela_a_consulta():
+    async def scenario():
+        rag = FakeRAG()
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(run_async_query(rag, "bateria", "mix"), 0.01)
+        await asyncio.sleep(0)
+        assert rag.cancelled == 1
+
+    asyncio.run(scenario())
+
+
+def test_chave_separa_manuais_top_k_e_modo_de_contexto():
+    async def scenario():
+        rag = FakeRAG()
+        rag.release.set()
+        await run_async_query(rag, "pneu", "mix", manuals=["fordka:v1"])
+        await run_async_query(rag, "pneu", "mix", manuals=["fordka:v2"])
+        await run_async_query(rag, "pneu", "mix", top_k=10, manuals=["fordka:v2"])
+        await run_async_query(rag, "pneu", "mix", only_need_context=True, manuals=["fordka:v2"])
+        assert rag.calls == 4
+        # Só o contexto: o LightRAG não gera a resposta
+        assert [p.only_need_context for p in rag.params] == [False, False, False, True]
+
+        await run_async_query(rag, "Pneu?", "mix", only_need_context=True, manuals=["fordka:v2"])
+        await run_async_query(rag, "pneu", "mix", use_cache=False)
+        assert rag.calls == 5
+
+    asyncio.run(scenario())
+
+
+def test_entrada_expira_pelo_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(retrieve.time, "monotonic", lambda: now[0])
+    cache = RetrievalCache(ttl_seconds=60)
+    cache.put("k", "contexto")
+    now[0] += 59
+    assert cache.get("k") == "contexto"
+    now[0] += 2
+    assert cache.get("k") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_memoria_limitada_por_entradas_e_bytes():
+    cache = RetrievalCache(max_entries=2)
+    cache.put("a", "1")
+    cache.put("b", "2")
+    assert cache.get("a") == "1"
+    cache.put("c", "3")
+    # "b" era a menos usada
+    assert cache.get("b") is None and cache.get("a") == "1"
+
+    small = RetrievalCache(max_bytes=200)
+    small.put("a", "x" * 100)
+    small.put("b", "y" * 100)
+    assert small.get("a") is None and small.get("b") == "y" * 100
+    small.put("grande", "z" * 500)
+    assert small.get("grande") is None and small.stats()["bytes"] <= 200
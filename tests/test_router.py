@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from agents.recepcionist.router import (
+    GREETING_REPLY,
+    OUT_OF_SCOPE_REPLY,
+    THANKS_REPLY,
+    PreRouter,
+)
+
+
+@pytest.fixture
+def router():
+    return PreRouter(min_confidence=0.75)
+
+
+def route(router, text):
+    return asyncio.run(router.route(text))
+
+
+@pytest.mark.parametrize("text", ["e do Mobi?", "e o Ka?", "Ford KA", "o ka e o mobi"])
+def test_mensagem_so_com_o_modelo_fica_com_o_recepcionista(router, text):
+    assert router.classify(text).confidence < router.min_confidence
+    assert route(router, text).kind == "llm"
+
+
+@pytest.mark.parametrize("text", ["Ford Ranger", "qual o óleo do Fiat Uno?", "o Ford é bom?"])
+def test_marca_sem_o_modelo_fica_com_o_recepcionista(router, text):
+    assert route(router, text).kind == "llm"
+
+
+@pytest.mark.parametrize(
+    "text, specialist",
+    [
+        ("Qual a pressão dos pneus do Ford Ka?", "especialista_fordka"),
+        ("qual o melhor óleo para o Mobi?", "especialista_fiatmobi"),
+        ("qual pneu é pior para o Ka?", "especialista_fordka"),
+        ("qual a diferença entre o Ka e o Mobi?", "especialista_generalista"),
+        ("compare o consumo do Ka e do Mobi", "especialista_generalista"),
+    ],
+)
+def test_pergunta_tecnica_com_modelo_vai_ao_especialista(router, text, specialist):
+    result = route(router, text)
+    assert result.kind == "specialist"
+    assert result.specialist == specialist
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "onde fica o número de série do chassi?",
+        "qual o número de série do motor?",
+        "o carro tem ações de recall?",
+    ],
+)
+def test_pergunta_sobre_carro_nao_e_recusada(router, text):
+    assert route(router, text).kind != "out_of_scope"
+
+
+@pytest.mark.parametrize("text", ["me conta uma piada", "quem ganhou o jogo de futebol?"])
+def test_fora_do_escopo(router, text):
+    result = route(router, text)
+    assert result.kind == "out_of_scope"
+    assert result.reply == OUT_OF_SCOPE_REPLY
+
+
+@pytest.mark.parametrize("text", ["obrigado!", "Muito obrigada", "valeu, tchau", "obrigado pela ajuda"])
+def test_agradecimento_tem_resposta_propria(router, text):
+    result = route(router, text)
+    assert result.kind == "thanks"
+    assert result.reply == THANKS_REPLY
+
+
+@pytest.mark.parametrize("text", ["oi", "Olá, tudo bem?", "bom dia"])
+def test_cumprimento(router, text):
+    result = route(router, text)
+    assert result.kind == "greeting"
+    assert result.reply == GREETING_REPLY
@@ -0,0 +1,93 @@
+import asyncio
+import sqlite3
+
+from google.adk.events import Event, EventActions
+
+from agents.plugins.sessions import BatchedSessionService
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def event(invocation_id, **delta):
+    return Event(invocation_id=invocation_id, author="user", actions=EventActions(state_delta=delta))
+
+
+async def _count_events(service, user_id, session_id):
+    session = await service.get_session(app_name="app", user_id=user_id, session_id=session_id)
+    return None if session is None else len(session.events)
+
+
+def test_turno_gravado_numa_transacao_sem_chaves_temp(tmp_path):
+    db = tmp_path / "dialog.db"
+
+    async def scenario():
+        service = BatchedSessionService(db_url=f"sqlite+aiosqlite:///{db}")
+        try:
+            session = await service.create_session(app_name="app", user_id="u", session_id="s1")
+            await service.append_event(session, event("inv-1", rota="specialist", **{"temp:rascunho": "x"}))
+            await service.append_event(session, event("inv-1", resposta_final="ok"))
+            # Nada no banco antes do fim do turno; o estado em memória tem o rascunho
+            assert sqlite3.connect(db).execute("SELECT count(*) FROM events").fetchone() == (0,)
+            assert session.state["temp:rascunho"] == "x"
+
+            assert await service.flush_session(session) == 2
+            stored = await service.get_session(app_name="app", user_id="u", session_id="s1")
+            assert len(stored.events) == 2
+            assert stored.state == {"rota": "specialist", "resposta_final": "ok"}
+        finally:
+            await service.close()
+
+    run(scenario())
+
+
+def test_compactacao_respeita_o_usuario_da_sessao(tmp_path):
+    db = tmp_path / "dialog.db"
+
+    async def scenario():
+        service = BatchedSessionService(db_url=f"sqlite+aiosqlite:///{db}")
+        try:
+            for user in ("alice", "bob"):
+                session = await service.create_session(app_name="app", user_id=user, session_id="s1")
+                await service.append_event(session, event(f"inv-{user}", ultima=user))
+            await service.flush()
+
+            con = sqlite3.connect(db)
+            con.execute("UPDATE sessions SET update_time = '2000-01-01 00:00:00' WHERE user_id = 'alice'")
+            con.commit()
+
+            assert await service.compact(ttl_seconds=3600) == 1
+            assert await _count_events(service, "alice", "s1") is None
+            assert await _count_events(service, "bob", "s1") == 1
+            assert con.execute("SELECT user_id FROM events").fetchall() == [("bob",)]
+        finally:
+            await service.close()
+
+    run(scenario())
+
+
+def test_sessao_alterada_por_outro_processo_nao_perde_o_turno(tmp_path):
+    db = tmp_path / "dialog.db"
+
+    async def scenario():
+        mine = BatchedSessionService(db_url=f"sqlite+aiosqlite:///{db}")
+        other = BatchedSessionService(db_url=f"sqlite+aiosqlite:///{db}")
+        try:
+            await mine.create_session(app_name="app", user_id="u", session_id="s1")
+            session = await mine.get_session(app_name="app", user_id="u", session_id="s1")
+            elsewhere = await other.get_session(app_name="app", user_id="u", session_id="s1")
+
+            await other.append_event(elsewhere, event("inv-outro", a=1))
+            await other.flush()
+            await mine.append_event(session, event("inv-meu", b=2))
+            assert await mine.flush_session(session) == 1
+
+            stored = await mine.get_session(app_name="app", user_id="u", session_id="s1")
+            assert [e.invocation_id for e in stored.events] == ["inv-outro", "inv-meu"]
+            assert stored.state == {"a": 1, "b": 2}
+        finally:
+            await mine.close()
+            await other.close()
+
+    run(scenario())
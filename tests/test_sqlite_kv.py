@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+import pytest
+from lightrag.exceptions import StorageNotInitializedError
+
+from agents.plugins.storage.sqlite_kv import SQLiteKVStorage
+
+
+def storage(tmp_path, namespace="text_chunks"):
+    return SQLiteKVStorage(
+        namespace=namespace,
+        workspace="fordka",
+        global_config={"working_dir": str(tmp_path)},
+        embedding_func=None,
+    )
+
+
+def test_leituras_e_escritas_por_namespace(tmp_path):
+    async def scenario():
+        chunks, docs = storage(tmp_path), storage(tmp_path, "full_docs")
+        await chunks.initialize()
+        await docs.initialize()
+        try:
+            assert await chunks.is_empty()
+            await chunks.upsert({"c1": {"content": "pneu"}, "c2": {"content": "óleo"}})
+            await docs.upsert({"c1": {"content": "manual"}})
+
+            assert [r and r["content"] for r in await chunks.get_by_ids(["c2", "x", "c1"])] == ["óleo", None, "pneu"]
+            assert (await chunks.get_by_id("c1"))["llm_cache_list"] == []
+            assert await chunks.filter_keys({"c1", "c3"}) == {"c3"}
+
+            await chunks.delete(["c1"])
+            assert await chunks.get_by_id_strict("c1") is None
+            assert (await docs.get_by_id("c1"))["content"] == "manual"
+            await chunks.drop()
+            assert await chunks.is_empty() and not await docs.is_empty()
+        finally:
+            await chunks.finalize()
+            await docs.finalize()
+
+    asyncio.run(scenario())
+
+
+def test_leituras_rodam_fora_do_event_loop(tmp_path, monkeypatch):
+    threads = set()
+    select = SQLiteKVStorage._select
+
+    def spy(self, ids):
+        threads.add(threading.get_ident())
+        return select(self, ids)
+
+    monkeypatch.setattr(SQLiteKVStorage, "_select", spy)
+
+    async def scenario():
+        kv = storage(tmp_path)
+        await kv.initialize()
+        try:
+            await kv.upsert({"c1": {"content": "pneu"}})
+            await asyncio.gather(*(kv.get_by_id("c1") for _ in range(4)))
+        finally:
+            await kv.finalize()
+        with pytest.raises(StorageNotInitializedError):
+            await kv.get_by_id_strict("c1")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(scenario())
+    assert threads and loop_thread not in threads
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from agents.plugins import telemetry
+from agents.plugins.telemetry import Metrics, Span
+
+
+@pytest.fixture
+def exporter(monkeypatch):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(telemetry, "_tracer", provider.get_tracer("teste"))
+    return exporter
+
+
+def finished(exporter):
+    return {s.name: s for s in exporter.get_finished_spans()}
+
+
+def test_rotulos_escapam_aspas_barras_e_quebras_de_linha():
+    metrics = Metrics()
+    metrics.inc("carhelper_teste_total", q='a"b\\c\nd')
+    assert 'carhelper_teste_total{q="a\\"b\\\\c\\nd"} 1' in metrics.render()
+
+
+def test_span_filho_fica_sob_o_span_corrente(exporter):
+    with Span("agent.recepcionista"):
+        with Span("tool.busca_documentos") as tool:
+            tool.add("llm.prompt_tokens", 10)
+            tool.add("llm.prompt_tokens", 5)
+    spans = finished(exporter)
+    assert spans["tool.busca_documentos"].parent.span_id == spans["agent.recepcionista"].context.span_id
+    assert spans["tool.busca_documentos"].attributes["llm.prompt_tokens"] == 15
+    assert telemetry._current.get() is None
+
+
+def test_tarefa_filha_herda_o_span_e_sem_attach_nao_vira_corrente(exporter):
+    async def scenario():
+        with Span("agent.especialista"):
+            with Span("agent.paralelo", attach=False):
+                await asyncio.ensure_future(child())
+
+    async def child():
+        with Span("rag.aquery"):
+            pass
+
+    asyncio.run(scenario())
+    spans = finished(exporter)
+    parent = spans["agent.especialista"].context.span_id
+    assert spans["rag.aquery"].parent.span_id == parent
+    assert spans["agent.paralelo"].parent.span_id == parent
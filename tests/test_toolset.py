@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from agents.tools import toolset
+from agents.tools.toolset import fan_out, query_for_manual
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        ("qual consome menos, Ka ou Mobi?", "Ford KA: qual consome menos?"),
+        ("o Ka tem airbag? e o Mobi?", "Ford KA: tem airbag?"),
+        ("o Mobi tem ABS? E o Ka?", "Ford KA: tem ABS?"),
+        ("compare o Ka com o Mobi", "Ford KA: compare o Ka com o Mobi"),
+        ("compare o consumo do Ka e do Mobi", "Ford KA: compare o consumo"),
+        ("Ka vs. Mobi: qual gasta menos?", "Ford KA: qual gasta menos?"),
+        ("e o Ka?", "Ford KA: e o Ka?"),
+    ],
+)
+def test_query_for_manual(query, expected):
+    assert query_for_manual(query, "fordka") == expected
+
+
+def test_fan_out_isola_falha_de_um_manual(monkeypatch, caplog):
+    async def search_manual(manual, query, top_k=None):
+        if manual == "mobi":
+            raise RuntimeError("índice corrompido")
+        return "pressão de 30 psi"
+
+    monkeypatch.setattr(toolset, "search_manual", search_manual)
+    result = asyncio.run(fan_out(["fordka", "mobi"], "qual a pressão dos pneus do Ka e do Mobi?"))
+
+    ka, mobi = result.split("\n\n## ")
+    assert "pressão de 30 psi" in ka
+    assert "Sem resultado: a consulta a este manual falhou." in mobi
+    assert "Falha na consulta ao manual mobi: índice corrompido" in caplog.text